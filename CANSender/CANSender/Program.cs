@@ -46,6 +46,15 @@ public class CanSender
         }
     }
 
+    // [GENERATED_SERIALIZE_START]
+    private static byte[] SerializeFrame(CanFrame frame)
+    {
+        List<byte> bytes = new List<byte>();
+        bytes.AddRange(BitConverter.GetBytes(frame.TestInt));
+        return bytes.ToArray();
+    }
+    // [GENERATED_SERIALIZE_END]
+    // [GENERATED_SEND_START]
     public static void SendCanFrame(SerialPort serialPort, CanFrame frame)
     {
         // Schritt 1: Das Struct logisch in Bytes zerlegen
@@ -57,14 +66,6 @@ public class CanSender
         // Schritt 3: Absenden
         serialPort.Write(encoded, 0, encoded.Length);
     }
-    // [GENERATED_SERIALIZE_START]
-    private static byte[] SerializeFrame(CanFrame frame)
-    {
-        List<byte> bytes = new List<byte>();
-        bytes.AddRange(BitConverter.GetBytes(frame.TestInt));
-        return bytes.ToArray();
-    }
-    // [GENERATED_SERIALIZE_END]
     public static byte[] CobsEncode(byte[] input)
     {
         List<byte> output = new List<byte>();
@@ -91,4 +92,5 @@ public class CanSender
         output.Add(0x00); // Zero-Terminator
         return output.ToArray();
     }
+    // [GENERATED_SEND_END]
 }
\ No newline at end of file
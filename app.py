@@ -1,10 +1,20 @@
-from flask import Flask, render_template, request, jsonify
-import os
+from flask import Flask, render_template, request, jsonify, abort, Response
+import argparse
 import json
-import re
+import os
+import queue
 from threading import Thread
 import webbrowser
 
+import artifacts
+import canbus
+import codegen
+import filewatch
+import layout
+import statemachine
+import structparse
+import workspaces
+
 app = Flask(__name__, template_folder='.', static_folder='static')
 
 # Configuration
@@ -12,86 +22,34 @@ CONFIG_FILE = "generator_config.json"
 DEFAULT_CONFIG = {
     "path_cs": r"C:/Users/benja/Documents/htlwy/2526/ccit/CANSender/CANSender/Program.cs",
     "path_cpp": r"C:/Users/benja/Documents/htlwy/2526/ccit/14_COBS_Receive/05_CAN_Signals/UserCode/UserMain.cpp",
+    "path_py": "can_frame.py",
     "com_port": "COM3",
-    "baud_rate": "1500000"
-}
-
-TYPE_MAPPING = {
-    "int8_t / sbyte": ("int8_t", "sbyte"),
-    "uint8_t / byte": ("uint8_t", "byte"),
-    "int16_t / short": ("int16_t", "short"),
-    "uint16_t / ushort": ("uint16_t", "ushort"),
-    "int32_t / int": ("int32_t", "int"),
-    "uint32_t / uint": ("uint32_t", "uint"),
-    "int64_t / long": ("int64_t", "long"),
-    "uint64_t / ulong": ("uint64_t", "ulong"),
-    "float": ("float", "float"),
-    "double": ("double", "double"),
-    "bool": ("bool", "bool"),
+    "baud_rate": "1500000",
+    "cs_serializer": codegen.DEFAULT_CS_SERIALIZER,
+    "frame_mode": codegen.DEFAULT_FRAME_MODE,
+    "keyframe_interval": codegen.DEFAULT_KEYFRAME_INTERVAL,
+    "can_mode": canbus.DEFAULT_CAN_MODE,
+    "can_base_id": canbus.DEFAULT_CAN_BASE_ID,
+    "sm_dispatch": statemachine.DEFAULT_SM_DISPATCH
 }
 
-# Global state
-config = None
-variables = []
-state_machine = {
-    "classname": "CanFrameSender",
-    "states": [],
-    "events": [],
-    "transitions": []
-}
+# Per-project state; requests pick the project with the X-Project-Id header or ?project=
+store = workspaces.WorkspaceStore(DEFAULT_CONFIG, CONFIG_FILE)
 
+# Generated code by hash of the normalized spec, shared by all projects
+cache = artifacts.ArtifactCache()
 
-def load_config():
-    global config
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                return
-        except:
-            pass
-    config = DEFAULT_CONFIG.copy()
+# Parsed structs of the target files, pushed to the browsers over /api/events
+watcher = filewatch.FileWatcher()
+SSE_KEEPALIVE = 15
 
 
-def save_config():
+def current_workspace():
+    project_id = request.headers.get('X-Project-Id') or request.args.get('project')
     try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4)
-        return True, "Config saved"
-    except Exception as e:
-        return False, str(e)
-
-
-def replace_in_file(file_path, start_tag, end_tag, new_content):
-    if not os.path.exists(file_path):
-        raise Exception(f"Path does not exist: {file_path}")
-
-    content = None
-    for enc in ['utf-8-sig', 'utf-8', 'latin-1']:
-        try:
-            with open(file_path, 'r', encoding=enc) as f:
-                content = f.read()
-                break
-        except:
-            continue
-    
-    if content is None:
-        raise Exception(f"Cannot read file: {file_path}")
-
-    pattern = f"{re.escape(start_tag)}.*?{re.escape(end_tag)}"
-    
-    if start_tag not in content:
-        raise Exception(f"Tag not found: {start_tag}")
-
-    match = re.search(f"^([ \t]*){re.escape(start_tag)}", content, re.MULTILINE)
-    indent = match.group(1) if match else ""
-    
-    replacement = f"{start_tag}\n{indent}{new_content}\n{indent}{end_tag}"
-    new_text = re.sub(pattern, replacement, content, flags=re.DOTALL)
-    
-    write_enc = 'utf-8-sig' if file_path.endswith(".cs") else 'utf-8'
-    with open(file_path, 'w', encoding=write_enc) as f:
-        f.write(new_text)
+        return store.get(project_id)
+    except ValueError as e:
+        abort(400, str(e))
 
 
 @app.route('/')
@@ -99,85 +57,186 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/api/projects', methods=['GET'])
+def get_projects():
+    return jsonify(store.project_ids())
+
+
 @app.route('/api/config', methods=['GET'])
 def get_config():
-    return jsonify(config)
+    ws = current_workspace()
+    with ws.lock:
+        return jsonify(ws.config)
 
 
 @app.route('/api/config', methods=['POST'])
 def update_config():
-    global config
-    data = request.json
-    config.update(data)
-    success, msg = save_config()
+    ws = current_workspace()
+    with ws.lock:
+        ws.config.update(request.json)
+        success, msg = ws.save_config()
+        watcher.set_paths(ws.project_id, ws.config['path_cs'], ws.config['path_cpp'])
     return jsonify({"success": success, "message": msg})
 
 
 @app.route('/api/variables', methods=['GET'])
 def get_variables():
-    return jsonify(variables)
+    ws = current_workspace()
+    with ws.lock:
+        return jsonify(ws.variables)
 
 
 @app.route('/api/variables', methods=['POST'])
 def update_variables():
-    global variables
-    variables = request.json
+    ws = current_workspace()
+    with ws.lock:
+        ws.variables = request.json
     return jsonify({"success": True})
 
 
+@app.route('/api/variables/from-files', methods=['GET'])
+def variables_from_files():
+    """Variables of the structs already in the target files, with every mismatch"""
+    ws = current_workspace()
+    with ws.lock:
+        path_cs, path_cpp = ws.config['path_cs'], ws.config['path_cpp']
+    final_vars, problems = structparse.load_variables(path_cs, path_cpp)
+    return jsonify({
+        "variables": [{"cpp": cpp, "cs": cs, "name": name} for cpp, cs, name in final_vars],
+        "problems": problems
+    })
+
+
 @app.route('/api/generate', methods=['POST'])
 def generate_code():
-    global variables
+    ws = current_workspace()
     data = request.json
-    variables = data.get('variables', [])
+    var_list = data.get('variables', [])
+    with ws.lock:
+        ws.variables = var_list
+        config = dict(ws.config)
     
-    if not variables:
+    if not var_list:
         return jsonify({"success": False, "message": "No variables defined"})
 
-    final_vars = [(v['cpp'], v['cs'], v['name']) for v in variables if v['cpp'] and v['cs'] and v['name']]
+    final_vars = codegen.final_vars_from_rows(var_list)
     
     if not final_vars:
         return jsonify({"success": False, "message": "Invalid variables"})
 
-    cs_struct = "public struct CanFrame {\n"
-    cs_serialize = "    private static byte[] SerializeFrame(CanFrame frame) {\n        List<byte> bytes = new List<byte>();\n"
-    for _, cs_type, name in final_vars:
-        cs_struct += f"    public {cs_type} {name};\n"
-        cs_serialize += f"        bytes.AddRange(BitConverter.GetBytes(frame.{name}));\n"
-    cs_struct += "}"
-    cs_serialize += "        return bytes.ToArray();\n    }"
+    frame_mode = config.get('frame_mode', codegen.DEFAULT_FRAME_MODE)
+    keyframe_interval = config.get('keyframe_interval', codegen.DEFAULT_KEYFRAME_INTERVAL)
+    can_mode = config.get('can_mode', canbus.DEFAULT_CAN_MODE)
+    can_base_id = config.get('can_base_id', canbus.DEFAULT_CAN_BASE_ID)
+    try:
+        frame_layout = layout.compute_layout(final_vars, delta=frame_mode == "delta")
+        mapping = canbus.map_messages(frame_layout, can_mode, can_base_id) if can_mode != "off" else None
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)})
 
-    cpp_struct = "struct __attribute__((packed)) CanFrame {\n"
-    for cpp_type, _, name in final_vars:
-        cpp_struct += f"    {cpp_type} {name};\n"
-    cpp_struct += "};"
+    # The firmware drops frames that do not fit rxBuffer/decodedBuffer
+    problems = layout.check_receiver(frame_layout, layout.read_receiver_limits(config['path_cpp']))
+    if problems and not data.get('force'):
+        return jsonify({"success": False, "message": "; ".join(problems), "layout_problems": problems, "layout": frame_layout.to_dict()})
+
+    serializer = config.get('cs_serializer', codegen.DEFAULT_CS_SERIALIZER)
 
     try:
-        replace_in_file(config['path_cs'], "// [GENERATED_STRUCT_START]", "// [GENERATED_STRUCT_END]", cs_struct)
-        replace_in_file(config['path_cs'], "// [GENERATED_SERIALIZE_START]", "// [GENERATED_SERIALIZE_END]", cs_serialize)
-        replace_in_file(config['path_cpp'], "// [GENERATED_STRUCT_START]", "// [GENERATED_STRUCT_END]", cpp_struct)
-        return jsonify({"success": True, "message": "Code generated successfully!"})
+        spec = {"vars": final_vars, "serializer": serializer, "frame_mode": frame_mode,
+                "keyframe_interval": keyframe_interval, "can_mode": can_mode, "can_base_id": can_base_id}
+        _, code = cache.get_or_build("variables", spec, lambda: codegen.generate_code(
+            final_vars, serializer, frame_mode, keyframe_interval, can_mode, can_base_id))
+
+        # Projects sharing a target file generate one after another
+        with workspaces.locked_paths([config['path_cs'], config['path_cpp'], config.get('path_py')]):
+            written = codegen.write_code(code, config['path_cs'], config['path_cpp'], config.get('path_py'))
+
+        report = ", ".join(f"{os.path.basename(p)} {'written' if w else 'unchanged'}" for p, w in written.items())
+        summary = frame_layout.summary() + (f", {mapping.summary()}" if mapping else "")
+        return jsonify({
+            "success": True,
+            "message": f"Code generated successfully! {report}. {summary}",
+            "files": written,
+            "layout": frame_layout.to_dict(),
+            "can": mapping.to_dict() if mapping else None
+        })
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
 
 
+@app.route('/api/events', methods=['GET'])
+def events():
+    """Server-Sent Events: "snapshot" on connect, "variables" whenever the target structs change"""
+    ws = current_workspace()
+    with ws.lock:
+        path_cs, path_cpp = ws.config['path_cs'], ws.config['path_cpp']
+    q, state = watcher.subscribe(ws.project_id, path_cs, path_cpp)
+
+    def stream():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(state)}\n\n"
+            while True:
+                try:
+                    event = q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    # Comment line, lets proxies and the server notice closed connections
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: variables\ndata: {json.dumps(event)}\n\n"
+        finally:
+            watcher.unsubscribe(ws.project_id, q)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/frame-budget', methods=['POST'])
+def frame_budget():
+    ws = current_workspace()
+    data = request.json or {}
+    with ws.lock:
+        var_list = data.get('variables', ws.variables)
+        baud_rate = data.get('baud_rate', ws.config['baud_rate'])
+        frame_mode = data.get('frame_mode', ws.config.get('frame_mode', codegen.DEFAULT_FRAME_MODE))
+    final_vars = codegen.final_vars_from_rows(var_list)
+
+    try:
+        frame_layout = layout.compute_layout(final_vars, delta=frame_mode == "delta")
+        budget = layout.link_budget(
+            frame_layout,
+            baud_rate,
+            data.get('send_rate'),
+            data.get('bits_per_byte', 10)
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)})
+
+    return jsonify({"success": True, "budget": budget, "layout": frame_layout.to_dict()})
+
+
 @app.route('/api/state-machine', methods=['GET'])
 def get_state_machine():
-    return jsonify(state_machine)
+    ws = current_workspace()
+    with ws.lock:
+        return jsonify(ws.state_machine)
 
 
 @app.route('/api/state-machine', methods=['POST'])
 def update_state_machine():
-    global state_machine
-    state_machine = request.json
+    ws = current_workspace()
+    with ws.lock:
+        ws.state_machine = request.json
     return jsonify({"success": True})
 
 
 @app.route('/api/generate-sm', methods=['POST'])
 def generate_state_machine():
-    global state_machine
+    ws = current_workspace()
     data = request.json
-    state_machine.update(data)
+    with ws.lock:
+        ws.state_machine.update(data)
+        state_machine = dict(ws.state_machine)
+        sm_dispatch = ws.config.get('sm_dispatch', statemachine.DEFAULT_SM_DISPATCH)
     
     classname = state_machine.get('classname', 'CanFrameSender').strip()
     states = [s.strip() for s in state_machine.get('states', []) if s.strip()]
@@ -187,94 +246,88 @@ def generate_state_machine():
     if not classname or not states or not events or not transitions:
         return jsonify({"success": False, "message": "Missing required fields"})
 
-    states_enum = ", ".join(states)
-    events_enum = ", ".join(events)
-
-    code = f"""class {classname} {{
-\tpublic:
-\t\tenum class State {{ {states_enum} }} S;
-\t\tenum class Event {{ None, {events_enum} }} E;
-\t\t
-\t\tbool\t\tiniOK = false;
-\t\tuint64_t\tt_cyc = 0;
-\t\tfloat\t\tt = 0;
-
-\t\tbool\t\tclick_Edge = false;
-
-\t\tvoid compute(float T)
-\t\t{{
-\t\t\t
-\t\t\tif(!iniOK) t_cyc = 0;
-\t\t\telse if(E == Event::None) t_cyc++;
-\t\t\telse t_cyc = 0;
-\t\t\tt = (t_cyc + 0.5f) * T;
-\t\t\t
-"""
-    
-    first_state = transitions[0][0] if transitions else states[0]
-    code += f"\t\tif     (!iniOK) {{ E = Event::Init; S = State::{first_state}; }}\n"
-    
-    for trans in transitions:
-        from_state, event, to_state, conditions, output_action = trans[:5]
-        
-        condition_parts = []
-        for cond in conditions:
-            var, op, val = cond
-            if var == "click_Edge":
-                condition_parts.append("click_Edge")
-            else:
-                condition_parts.append(f"{var} {op} {val}")
-        
-        condition_str = " && ".join(condition_parts)
-        
-        if condition_str:
-            code += f"\t\telse if(S==State::{from_state} && {condition_str}) {{ E = Event::{event}; S = State::{to_state}; }}\n"
-        else:
-            code += f"\t\telse if(S==State::{from_state}) {{ E = Event::{event}; S = State::{to_state}; }}\n"
-    
-    code += "\t\telse{ E = Event::None; }\n\t\t\t\n\t\t\t//Outputs\n"
-    
-    output_actions = {}
-    for trans in transitions:
-        from_state, event, to_state, conditions, output_action = trans[:5]
-        if output_action:
-            output_actions[event] = output_action
-    
-    if output_actions:
-        first_output = True
-        for event in events:
-            if event != "Init" and event in output_actions:
-                action = output_actions[event]
-                if first_output:
-                    code += f"\t\tif\t\t\t(E==Event::{event:<20}\t) {action}\n"
-                    first_output = False
-                else:
-                    code += f"\t\telse if\t(E==Event::{event:<20}\t) {action}\n"
-        
-        if not first_output:
-            code += "\t\telse;\n"
-    else:
-        code += f"\t\tif\t\t\t(E==Event::Init) {{}}\n"
-        code += "\t\t// TODO: Weitere Event-Outputs implementieren\n"
-    
-    code += "\t\t\n\t\tiniOK = true;\n\t\t}\n};"
-    
-    return jsonify({"success": True, "code": code})
+    dispatch = state_machine.get('dispatch') or sm_dispatch
+    try:
+        transitions = [statemachine.normalize_transition(t) for t in transitions]
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Invalid transitions"})
+    spec = {"classname": classname, "states": states, "events": events,
+            "transitions": transitions, "dispatch": dispatch}
+
+    # The client still has this code: no generation, no body
+    key = artifacts.spec_key("state_machine", spec)
+    if request.if_none_match.contains(artifacts.etag(key)):
+        response = Response(status=304)
+        response.set_etag(artifacts.etag(key))
+        return response
+
+    def build():
+        # Unknown states/events would produce code that does not compile
+        unknown = statemachine.unknown_names(states, events, transitions)
+        if unknown:
+            raise ValueError("Unknown states/events: " + "; ".join(unknown))
+        return statemachine.generate_cpp_statemachine(classname, states, events, transitions, dispatch)
+
+    try:
+        key, code = cache.get_or_build("state_machine", spec, build)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)})
+
+    response = jsonify({"success": True, "code": code})
+    response.set_etag(artifacts.etag(key))
+    return response
+
+
+@app.route('/api/analyze-sm', methods=['POST'])
+def analyze_state_machine():
+    ws = current_workspace()
+    data = request.json or {}
+    with ws.lock:
+        state_machine = dict(ws.state_machine)
+    states = [s.strip() for s in data.get('states', state_machine.get('states', [])) if s.strip()]
+    events = [e.strip() for e in data.get('events', state_machine.get('events', [])) if e.strip()]
+    transitions = data.get('transitions', state_machine.get('transitions', []))
+
+    if not states or not transitions:
+        return jsonify({"success": False, "message": "States and transitions are required"})
+
+    return jsonify({"success": True, "analysis": statemachine.analyze(states, events, transitions)})
+
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache_stats():
+    return jsonify(cache.stats())
 
 
 @app.route('/api/type-mapping', methods=['GET'])
 def get_type_mapping():
-    return jsonify(TYPE_MAPPING)
+    return jsonify(codegen.TYPE_MAPPING)
+
+
+def serve(host, port, threads):
+    """Multi-threaded production server (waitress), Flask's threaded server without it"""
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("waitress not installed (pip install waitress), using Flask's threaded server")
+        app.run(debug=False, host=host, port=port, threaded=True)
+    else:
+        waitress_serve(app, host=host, port=port, threads=threads)
 
 
 if __name__ == '__main__':
-    load_config()
-    
-    # Open browser automatically
-    def open_browser():
-        webbrowser.open('http://127.0.0.1:5000')
-    
-    Thread(target=open_browser, daemon=True).start()
+    parser = argparse.ArgumentParser(description="CAN Frame Generator web app")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on, 0.0.0.0 for the whole team")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32,
+                        help="worker threads; every open browser tab holds one for /api/events")
+    parser.add_argument("--no-browser", action="store_true", help="do not open a browser")
+    args = parser.parse_args()
+
+    url = f"http://{'127.0.0.1' if args.host == '0.0.0.0' else args.host}:{args.port}"
+    if not args.no_browser:
+        # Open browser automatically
+        Thread(target=lambda: webbrowser.open(url), daemon=True).start()
     
-    print("CAN Frame Generator running at http://127.0.0.1:5000")
-    app.run(debug=False, host='127.0.0.1', port=5000)
+    print(f"CAN Frame Generator running at {url}")
+    serve(args.host, args.port, args.threads)
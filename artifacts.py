@@ -0,0 +1,67 @@
+"""Content-addressed cache for generated code.
+
+An artifact is keyed by the SHA-256 of its normalized spec (canonical JSON
+of the variables or the state machine plus the generator options), so equal
+specs share one entry no matter which project or request produced them.
+The key doubles as HTTP ETag: a client that already has the code sends
+If-None-Match and gets 304 without the server generating anything.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = 256
+
+
+def spec_key(kind, spec):
+    """Hex digest of kind + spec; spec must be JSON serializable"""
+    canonical = json.dumps([kind, spec], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def etag(key):
+    """ETag of an artifact, unquoted as Werkzeug expects it"""
+    return key[:32]
+
+
+class ArtifactCache:
+    """Thread-safe LRU of generated artifacts"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, kind, spec, build):
+        """(key, artifact) of spec; build() runs only on a miss.
+
+        Exceptions of build() propagate and nothing is cached. Two threads
+        missing the same key may both build; the result is identical.
+        """
+        key = spec_key(kind, spec)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return key, self._entries[key]
+            self.misses += 1
+        artifact = build()
+        with self._lock:
+            self._entries[key] = artifact
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return key, artifact
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize,
+                    "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
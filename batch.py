@@ -0,0 +1,215 @@
+"""Headless batch generation for many projects (board variants).
+
+Reads every *.json project spec of a directory and generates its code
+without tkinter or Flask, in parallel across a process pool:
+
+    python batch.py specs/
+    python batch.py specs/ --jobs 8 --force
+
+A spec holds the generator_config.json keys plus the variables and the
+state machine, in the format of the web app:
+
+    {
+        "path_cs": "../CANSender/Program.cs",
+        "path_cpp": "../UserCode/UserMain.cpp",
+        "path_py": "can_frame.py",
+        "cs_serializer": "span",
+        "frame_mode": "delta",
+        "keyframe_interval": 20,
+        "can_mode": "classic",
+        "can_base_id": "0x100",
+        "variables": [{"cpp": "float", "cs": "float", "name": "speed"}],
+        "state_machine": {"classname": "CanFrameSender", "states": [...],
+                          "events": [...], "transitions": [...]},
+        "sm_dispatch": "table",
+        "path_sm": "../UserCode/CanFrameSender.hpp"
+    }
+
+Relative paths are relative to the spec file. Every key is optional except
+the targets of what is generated; path_sm receives the whole state machine
+code. Specs that write into the same file run one after another in the
+same worker, everything else in parallel.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import canbus
+import codegen
+import layout
+import rewrite
+import statemachine
+
+_PATH_KEYS = ("path_cs", "path_cpp", "path_py", "path_sm")
+
+
+def load_spec(spec_path):
+    """Spec with its paths made absolute"""
+    with open(spec_path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    if not isinstance(spec, dict):
+        raise ValueError(f"{spec_path}: expected a JSON object, got {type(spec).__name__}")
+    base = os.path.dirname(os.path.abspath(spec_path))
+    for key in _PATH_KEYS:
+        if spec.get(key):
+            spec[key] = os.path.normpath(os.path.join(base, spec[key]))
+    spec.setdefault("name", os.path.splitext(os.path.basename(spec_path))[0])
+    spec["spec_path"] = spec_path
+    return spec
+
+
+def generate_project(spec, force=False):
+    """Generate one spec; {path: written} of all target files"""
+    plan = {}
+    files = {}
+
+    final_vars = codegen.final_vars_from_rows(spec.get("variables", []))
+    if final_vars:
+        if not spec.get("path_cs") or not spec.get("path_cpp"):
+            raise ValueError("path_cs and path_cpp are required for variables")
+        frame_mode = spec.get("frame_mode", codegen.DEFAULT_FRAME_MODE)
+        frame_layout = layout.compute_layout(final_vars, delta=frame_mode == "delta")
+        problems = layout.check_receiver(frame_layout, layout.read_receiver_limits(spec["path_cpp"]))
+        if problems and not force:
+            raise ValueError("; ".join(problems) + " (--force generates anyway)")
+
+        code = codegen.generate_code(final_vars, spec.get("cs_serializer", codegen.DEFAULT_CS_SERIALIZER), frame_mode,
+                                     spec.get("keyframe_interval", codegen.DEFAULT_KEYFRAME_INTERVAL),
+                                     spec.get("can_mode", canbus.DEFAULT_CAN_MODE),
+                                     spec.get("can_base_id", canbus.DEFAULT_CAN_BASE_ID))
+        codegen.rewrite_plan(code, spec["path_cs"], spec["path_cpp"], plan)
+        if spec.get("path_py"):
+            files[spec["path_py"]] = code["py_module"]
+
+    sm = spec.get("state_machine")
+    if sm and sm.get("transitions"):
+        if not spec.get("path_sm"):
+            raise ValueError("path_sm is required for the state machine")
+        states = [s.strip() for s in sm.get("states", []) if s.strip()]
+        events = [e.strip() for e in sm.get("events", []) if e.strip()]
+        transitions = sm["transitions"]
+        unknown = statemachine.unknown_names(states, events, transitions)
+        if unknown:
+            raise ValueError("Unknown states/events: " + "; ".join(unknown))
+        dispatch = sm.get("dispatch") or spec.get("sm_dispatch", statemachine.DEFAULT_SM_DISPATCH)
+        files[spec["path_sm"]] = statemachine.generate_cpp_statemachine(
+            sm.get("classname", "CanFrameSender").strip(), states, events, transitions, dispatch) + "\n"
+
+    if not plan and not files:
+        raise ValueError("Nothing to generate (no variables, no transitions)")
+
+    # Marker files are all rendered before the first one is written
+    written = rewrite.rewrite_files(plan)
+    for path, text in files.items():
+        written[path] = rewrite.write_if_changed(path, text)
+    return written
+
+
+def _run_group(specs, force):
+    """Worker: specs sharing target files, in order"""
+    results = []
+    for spec in specs:
+        t0 = time.perf_counter()
+        try:
+            files, error = generate_project(spec, force), None
+        except Exception as e:
+            files, error = {}, str(e)
+        results.append({"spec_path": spec["spec_path"], "name": spec["name"], "files": files, "error": error,
+                        "seconds": time.perf_counter() - t0})
+    return results
+
+
+def group_by_targets(specs):
+    """Lists of specs; specs with a common target file end up in one list"""
+    parent = list(range(len(specs)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, spec in enumerate(specs):
+        for key in _PATH_KEYS:
+            if spec.get(key):
+                real = os.path.normcase(os.path.realpath(spec[key]))
+                if real in owner:
+                    parent[find(i)] = find(owner[real])
+                else:
+                    owner[real] = i
+
+    groups = {}
+    for i, spec in enumerate(specs):
+        groups.setdefault(find(i), []).append(spec)
+    return list(groups.values())
+
+
+def run_batch(spec_paths, jobs=None, force=False):
+    """Results of all specs in the order of spec_paths"""
+    specs, results = [], {}
+    for path in spec_paths:
+        try:
+            specs.append(load_spec(path))
+        except (OSError, ValueError) as e:
+            results[path] = {"spec_path": path, "name": os.path.splitext(os.path.basename(path))[0],
+                             "files": {}, "error": f"Cannot load spec: {e}", "seconds": 0.0}
+
+    groups = group_by_targets(specs)
+    if jobs == 1 or len(groups) <= 1:
+        for group in groups:
+            results.update((r["spec_path"], r) for r in _run_group(group, force))
+    else:
+        # Imported here: a single project does not pay for multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for group_results in pool.map(_run_group, groups, [force] * len(groups)):
+                results.update((r["spec_path"], r) for r in group_results)
+    return [results[path] for path in spec_paths]
+
+
+def _spec_paths(paths):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".json"))
+        else:
+            found.append(path)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the code of many project specs in parallel")
+    parser.add_argument("specs", nargs="+", help="spec files or directories of *.json specs")
+    parser.add_argument("--jobs", "-j", type=int, help="worker processes (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true", help="generate even if the frame does not fit the firmware buffers")
+    args = parser.parse_args(argv)
+
+    spec_paths = _spec_paths(args.specs)
+    if not spec_paths:
+        parser.error("no *.json specs found")
+
+    t0 = time.perf_counter()
+    results = run_batch(spec_paths, args.jobs, args.force)
+    elapsed = time.perf_counter() - t0
+
+    width = max(len(r["name"]) for r in results)
+    changed = failed = 0
+    for r in results:
+        if r["error"]:
+            failed += 1
+            summary = f"FAILED: {r['error']}"
+        else:
+            changed += any(r["files"].values())
+            summary = ", ".join(f"{os.path.basename(p)} {'written' if w else 'unchanged'}" for p, w in r["files"].items())
+        print(f"{r['name']:<{width}}  {r['seconds'] * 1e3:7.1f} ms  {summary}")
+    print(f"{len(results)} projects in {elapsed:.2f} s: {changed} changed, "
+          f"{len(results) - changed - failed} unchanged, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
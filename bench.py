@@ -0,0 +1,273 @@
+"""Benchmark suite for the generation, rewrite and codec paths.
+
+Times, with fixed inputs and seeds:
+
+    generate      codegen.generate_code with 10 to 1000 fields (list and span,
+                  and span in delta frame mode)
+    rewrite       rewrite.rewrite_files up to the commit on 10 KB to 10 MB
+                  sources (scan, change check, streamed output into a null
+                  sink), alternating between two contents so every call
+                  renders; the fsync and rename would only time the disk
+    statemachine  generate_cpp_statemachine with 10 to 5000 transitions for
+                  every dispatch variant
+    cobs          encode_frames and StreamDecoder.feed, 16 and 64 byte frames
+    startup       python batch.py on one project (variables + state machine),
+                  interpreter start included
+
+Every case is run with timeit (autorange, best of --repeat) and reported as
+seconds per call, plus MB/s where a byte count is meaningful. Results are
+saved as JSON and compared against a baseline:
+
+    python bench.py                                  # run, compare with bench_baseline.json
+    python bench.py --save-baseline                  # store this machine's baseline
+    python bench.py -k statemachine --repeat 3       # only matching cases
+    python bench.py --tolerance 0.5 --output out.json
+
+A case is a regression if it is slower than the baseline by more than the
+tolerance (default 25 %) or exceeds its absolute budget (BUDGETS, e.g.
+100 ms cold start per firmware build); the exit code is then 1. Baselines
+are only comparable on the same machine and Python version.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import cobs
+import codegen
+import rewrite
+import statemachine
+
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_TOLERANCE = 0.25
+
+# Absolute limits in seconds, independent of the baseline
+BUDGETS = {
+    "startup/batch_one_project": 0.100,
+}
+
+# Byte-aligned types only, so the cases stay comparable with older baselines
+_TYPES = [types for types in codegen.TYPE_MAPPING.values() if ":" not in types[0]]
+
+
+def _final_vars(count, seed=0):
+    rng = random.Random(seed)
+    return [(*rng.choice(_TYPES), f"field{i}") for i in range(count)]
+
+
+def _state_machine(transitions, seed=0):
+    rng = random.Random(seed)
+    n_states = max(2, transitions // 4)
+    states = [f"S{i}" for i in range(n_states)]
+    events = ["Init"] + [f"E{i}" for i in range(max(1, transitions // 2))]
+    trans = []
+    for i in range(transitions):
+        conditions = rng.choice([[("t", ">", f"{rng.uniform(0.1, 5):.2f}")], [("click_Edge", "", "")], []])
+        output = f"out{i % 7}();" if rng.random() < 0.3 else ""
+        trans.append((states[i % n_states], rng.choice(events[1:]), rng.choice(states), conditions, output))
+    return states, events, trans
+
+
+def _source(size):
+    """C# file of about `size` bytes with the generated regions in the middle"""
+    filler = "    // hand-written code that the generator must keep untouched\n"
+    half = filler * max(1, size // (2 * len(filler)))
+    return (half + "// [GENERATED_STRUCT_START]\n// [GENERATED_STRUCT_END]\n"
+            + "// [GENERATED_SERIALIZE_START]\n// [GENERATED_SERIALIZE_END]\n" + half)
+
+
+class _NullSink:
+    def write(self, data):
+        return len(data)
+
+
+def cases(workdir):
+    """(name, function, bytes per call or None)"""
+    for fields in (10, 100, 1000):
+        final_vars = _final_vars(fields)
+        for serializer in codegen.CS_SERIALIZERS:
+            yield (f"generate/{serializer}/fields={fields}",
+                   lambda v=final_vars, s=serializer: codegen.generate_code(v, s), None)
+        yield (f"generate/delta/fields={fields}",
+               lambda v=final_vars: codegen.generate_code(v, "span", "delta"), None)
+
+    for label, size in (("10KB", 10_000), ("100KB", 100_000), ("1MB", 1_000_000), ("10MB", 10_000_000)):
+        path = os.path.join(workdir, f"Program_{label}.cs")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(_source(size))
+        plans = []
+        for seed in (1, 2):
+            final_vars = _final_vars(20, seed)
+            plans.append({path: [
+                rewrite.Region("// [GENERATED_STRUCT_START]", "// [GENERATED_STRUCT_END]", codegen.generate_cs_struct(final_vars)),
+                rewrite.Region("// [GENERATED_SERIALIZE_START]", "// [GENERATED_SERIALIZE_END]", codegen.generate_cs_serialize(final_vars)),
+            ]})
+        state = {"i": 0}
+
+        def rewrite_once(plans=plans, state=state):
+            state["i"] ^= 1
+            for file_path, regions in plans[state["i"]].items():
+                source = rewrite._MappedSource(file_path)
+                try:
+                    output = rewrite._plan_file(source, regions, file_path)
+                    if rewrite._plan_changes(source, *output):
+                        rewrite._stream_output(source, *output)(_NullSink())
+                finally:
+                    source.close()
+        yield f"rewrite/{label}", rewrite_once, os.path.getsize(path)
+
+    for transitions in (10, 100, 1000, 5000):
+        states, events, trans = _state_machine(transitions)
+        for dispatch in statemachine.SM_DISPATCHES:
+            yield (f"statemachine/{dispatch}/transitions={transitions}",
+                   lambda st=states, ev=events, tr=trans, d=dispatch:
+                   statemachine.generate_cpp_statemachine("Bench", st, ev, tr, d), None)
+
+    rng = random.Random(0)
+    for frame_size in (16, 64):
+        payloads = [bytes(rng.getrandbits(8) for _ in range(frame_size)) for _ in range(10_000)]
+        wire = bytes(cobs.encode_frames(payloads))
+        yield (f"cobs/encode_frames/{frame_size}B",
+               lambda p=payloads: cobs.encode_frames(p), frame_size * len(payloads))
+
+        def feed(wire=memoryview(wire), frame_size=frame_size):
+            decoder = cobs.StreamDecoder(frame_size=frame_size)
+            for offset in range(0, len(wire), 4096):
+                for _ in decoder.feed(wire[offset:offset + 4096]):
+                    pass
+        yield f"cobs/stream_decode/{frame_size}B", feed, len(wire)
+
+    spec = {
+        "path_cs": "Program.cs", "path_cpp": "UserMain.cpp", "path_py": "can_frame.py", "path_sm": "Sm.hpp",
+        "variables": [list(v) for v in _final_vars(10)],
+        "state_machine": dict(zip(("states", "events", "transitions"), _state_machine(10))),
+    }
+    with open(os.path.join(workdir, "Program.cs"), 'w', encoding='utf-8') as f:
+        f.write(_source(10_000))
+    with open(os.path.join(workdir, "UserMain.cpp"), 'w', encoding='utf-8') as f:
+        f.write("// [GENERATED_STRUCT_START]\n// [GENERATED_STRUCT_END]\n")
+    spec_path = os.path.join(workdir, "project.json")
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        json.dump(spec, f)
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch.py"), spec_path]
+    yield "startup/batch_one_project", lambda: subprocess.run(command, stdout=subprocess.DEVNULL, check=True), None
+
+
+def run(pattern=None, repeat=5):
+    workdir = tempfile.mkdtemp(prefix="canbench-")
+    results = {}
+    try:
+        for name, func, nbytes in cases(workdir):
+            if pattern and pattern not in name:
+                continue
+            timer = timeit.Timer(func)
+            number, _ = timer.autorange()
+            seconds = min(timer.repeat(repeat, number)) / number
+            results[name] = {"seconds": seconds}
+            if nbytes:
+                results[name]["mb_per_s"] = nbytes / seconds / 1e6
+            print(f"{name:<40} {_format_time(seconds)}" + (f"  {nbytes / seconds / 1e6:8.1f} MB/s" if nbytes else ""),
+                  flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Names of the cases slower than baseline * (1 + tolerance); prints the comparison"""
+    regressions = []
+    base = baseline.get("results", {})
+    if baseline.get("meta", {}).get("python") != current["meta"]["python"]:
+        print(f"note: baseline from Python {baseline.get('meta', {}).get('python')}, "
+              f"running {current['meta']['python']}")
+    for name, result in current["results"].items():
+        if name not in base:
+            print(f"{name:<40} new")
+            continue
+        ratio = result["seconds"] / base[name]["seconds"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 / (1 + tolerance):
+            flag = "  faster"
+        print(f"{name:<40} {_format_time(base[name]['seconds'])} -> {_format_time(result['seconds'])}  {ratio:5.2f}x{flag}")
+    return regressions
+
+
+def _format_time(seconds):
+    if seconds >= 1:
+        return f"{seconds:8.3f} s "
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:8.3f} ms"
+    return f"{seconds * 1e6:8.1f} us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark generation, file rewriting and COBS")
+    parser.add_argument("-k", dest="pattern", help="only cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case, the best one counts")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown before a case counts as regression (0.25 = 25 %%)")
+    args = parser.parse_args(argv)
+
+    current = run(args.pattern, args.repeat)
+
+    over_budget = [name for name, limit in BUDGETS.items()
+                   if name in current["results"] and current["results"][name]["seconds"] > limit]
+    for name in over_budget:
+        print(f"{name} over budget: {_format_time(current['results'][name]['seconds']).strip()} "
+              f"> {_format_time(BUDGETS[name]).strip()}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+    if args.save_baseline:
+        baseline = {"meta": current["meta"], "results": {}}
+        if args.pattern and os.path.exists(args.baseline):
+            # A partial run only updates its own cases
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline["results"] = json.load(f).get("results", {})
+        baseline["results"].update(current["results"])
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return 1 if over_budget else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline {args.baseline}, run with --save-baseline first")
+        return 1 if over_budget else 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print()
+    regressions = compare(current, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"no regressions beyond {args.tolerance:.0%}")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Mapping of the CanFrame onto classic CAN or CAN FD messages.
+
+The firmware forwards the received CanFrame onto the bus. A frame larger
+than one CAN payload (8 bytes, 64 with CAN FD) is split into several
+messages; every layout item (a field, or a run of bit fields) stays whole
+in one message. The items are bin-packed so the frame needs as few
+messages as possible:
+
+    first-fit decreasing, which is optimal when all item sizes divide each
+    other (byte-aligned frames: 1, 2, 4, 8 bytes); if it misses the lower
+    bound ceil(size / capacity), a bounded exact search tries to reach it
+
+Within a message the items keep their frame order. Message k has the
+identifier base_id + k, and the messages of one frame are sent in index
+order. The reassembler relies on that order instead of spending a payload
+byte on a sequence number.
+"""
+
+from collections import namedtuple
+
+import layout
+
+# Payload capacity per message
+CAN_BUSES = {"classic": 8, "fd": 64}
+CAN_MODES = ("off",) + tuple(CAN_BUSES)
+DEFAULT_CAN_MODE = "off"
+DEFAULT_CAN_BASE_ID = 0x100
+
+# Payload lengths a CAN FD DLC can express; shorter data is zero-padded
+FD_LENGTHS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64)
+
+MAX_STANDARD_ID = 0x7FF
+MAX_EXTENDED_ID = 0x1FFFFFFF
+
+# Nodes of the exact search before first-fit decreasing is kept
+SEARCH_LIMIT = 50_000
+
+# One item in a message: `size` bytes from `wire_offset` of the frame at `offset` of the message
+Piece = namedtuple("Piece", "offset wire_offset size names")
+# length includes the FD padding
+Message = namedtuple("Message", "index id length pieces")
+
+
+class CanMapping:
+    def __init__(self, bus, base_id, messages, size):
+        self.bus = bus
+        self.capacity = CAN_BUSES[bus]
+        self.base_id = base_id
+        self.messages = messages
+        self.size = size
+
+    @property
+    def extended_id(self):
+        return self.messages[-1].id > MAX_STANDARD_ID
+
+    @property
+    def min_messages(self):
+        """Lower bound of the message count, ceil(frame size / capacity)"""
+        return -(-self.size // self.capacity)
+
+    @property
+    def bus_bytes(self):
+        """Data bytes on the bus per frame, FD padding included"""
+        return sum(m.length for m in self.messages)
+
+    def summary(self):
+        kind = "CAN FD" if self.bus == "fd" else "classic CAN"
+        ids = f"0x{self.messages[0].id:X}"
+        if len(self.messages) > 1:
+            ids += f"-0x{self.messages[-1].id:X}"
+        return f"{len(self.messages)} {kind} message(s) {ids}, {self.bus_bytes} data bytes per frame"
+
+    def to_dict(self):
+        return {
+            "bus": self.bus,
+            "extended_id": self.extended_id,
+            "min_messages": self.min_messages,
+            "bus_bytes": self.bus_bytes,
+            "messages": [{"index": m.index, "id": m.id, "length": m.length,
+                          "fields": [name for p in m.pieces for name in p.names]} for m in self.messages],
+        }
+
+
+def parse_id(value):
+    """CAN identifier from a number or a string like "0x100" """
+    try:
+        return int(value.strip(), 0) if isinstance(value, str) else int(value)
+    except ValueError:
+        raise ValueError(f"Invalid CAN ID: {value!r}") from None
+
+
+def fd_length(size):
+    """Smallest CAN FD payload length holding size bytes"""
+    return next(n for n in FD_LENGTHS if n >= size)
+
+
+def _first_fit_decreasing(sizes, capacity):
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i])
+    bins, loads = [], []
+    for i in order:
+        for b, load in enumerate(loads):
+            if load + sizes[i] <= capacity:
+                bins[b].append(i)
+                loads[b] += sizes[i]
+                break
+        else:
+            bins.append([i])
+            loads.append(sizes[i])
+    return bins
+
+
+def _exact(sizes, capacity, count):
+    """Bins of the items in `count` bins, or None if not found within SEARCH_LIMIT nodes"""
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i])
+    # Bytes of the items not placed yet
+    remaining = [sum(sizes[i] for i in order[k:]) for k in range(len(order) + 1)]
+    loads = [0] * count
+    bins = [[] for _ in range(count)]
+    nodes = [0]
+
+    def place(k):
+        if k == len(order):
+            return True
+        nodes[0] += 1
+        if nodes[0] > SEARCH_LIMIT:
+            return False
+        # Free space that no remaining item fits into is lost
+        smallest = sizes[order[-1]]
+        usable = sum(capacity - load for load in loads if capacity - load >= smallest)
+        if usable < remaining[k]:
+            return False
+        size = sizes[order[k]]
+        tried = set()
+        for b in range(count):
+            # Bins with the same load are interchangeable
+            if loads[b] + size > capacity or loads[b] in tried:
+                continue
+            tried.add(loads[b])
+            loads[b] += size
+            bins[b].append(order[k])
+            if place(k + 1):
+                return True
+            loads[b] -= size
+            bins[b].pop()
+        return False
+
+    return bins if place(0) else None
+
+
+def map_messages(frame_layout, bus, base_id=DEFAULT_CAN_BASE_ID):
+    """CanMapping of a FrameLayout onto the fewest messages of bus ("classic" or "fd")"""
+    if bus not in CAN_BUSES:
+        raise ValueError(f"Unknown CAN bus: {bus}")
+    capacity = CAN_BUSES[bus]
+    items = frame_layout.items
+    sizes = [item.size for item in items]
+    if not items:
+        raise ValueError("No variables to map onto CAN messages")
+
+    bins = _first_fit_decreasing(sizes, capacity)
+    lower = -(-sum(sizes) // capacity)
+    if len(bins) > lower:
+        for count in range(lower, len(bins)):
+            found = _exact(sizes, capacity, count)
+            if found is not None:
+                bins = found
+                break
+
+    base_id = parse_id(base_id)
+    if base_id < 0 or base_id + len(bins) - 1 > MAX_EXTENDED_ID:
+        raise ValueError(f"CAN IDs 0x{base_id:X}+{len(bins) - 1} out of range")
+
+    # Frame order inside a message and across messages
+    bins = sorted((sorted(b) for b in bins if b), key=lambda b: b[0])
+    messages = []
+    for index, members in enumerate(bins):
+        pieces, offset = [], 0
+        for i in members:
+            item = items[i]
+            names = tuple(f.name for f in item.fields) if isinstance(item, layout.BitRun) else (item.name,)
+            pieces.append(Piece(offset, item.offset, item.size, names))
+            offset += item.size
+        length = fd_length(offset) if bus == "fd" else offset
+        messages.append(Message(index, base_id + index, length, tuple(pieces)))
+    return CanMapping(bus, base_id, messages, frame_layout.size)
@@ -0,0 +1,263 @@
+"""COBS reference codec for the CANSender -> firmware serial link.
+
+Every CanFrame travels COBS encoded and terminated by a single 0x00 byte,
+exactly like ``CobsEncode`` in Program.cs produces and ``COBS_Decode`` in
+UserMain.cpp consumes. This module is the host-side reference for both:
+
+    encode / decode         one frame, without the 0x00 delimiter
+    encode_frames           many payloads packed into one bytearray (wire format)
+    StreamDecoder           incremental decoder for arbitrary chunks, yields
+                            zero-copy memoryviews of the decoded frames
+
+Throughput (``python cobs.py``, CPython 3.11, x86-64, random payloads):
+
+                            16 byte frames          64 byte frames
+    encode_frames           ~ 50 MB/s payload       ~ 260 MB/s payload
+    StreamDecoder.feed      ~ 30-45 MB/s wire       ~ 130 MB/s wire
+
+A 1.5 Mbaud 8N1 link carries at most 150 000 bytes/s, so a capture is
+decoded 200x to 800x faster than real time.
+"""
+
+import time
+
+DELIMITER = 0x00
+
+# Longest run of non-zero bytes one code byte can describe
+_MAX_RUN = 254
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def max_encoded_size(length):
+    """Worst-case encoded size of a payload, without the 0x00 delimiter"""
+    return length + max(1, -(-length // _MAX_RUN))
+
+
+def _encode_into(out, data):
+    data = bytes(data)
+    # Fast path: typical CanFrames are short and every zero is one block
+    if len(data) < _MAX_RUN and 0 not in data:
+        out.append(len(data) + 1)
+        out += data
+        return
+
+    segments = data.split(b"\x00")
+    last = len(segments) - 1
+    for i, segment in enumerate(segments):
+        pos = 0
+        while len(segment) - pos >= _MAX_RUN:
+            out.append(0xFF)
+            out += segment[pos:pos + _MAX_RUN]
+            pos += _MAX_RUN
+        # A full 0xFF block at the very end needs no trailing code byte
+        if pos and pos == len(segment) and i == last:
+            continue
+        out.append(len(segment) - pos + 1)
+        out += segment[pos:]
+
+
+def encode(data):
+    """COBS-encode one payload (no delimiter appended)"""
+    out = bytearray()
+    _encode_into(out, data)
+    return bytes(out)
+
+
+def encode_frames(payloads, out=None):
+    """Encode many payloads into one bytearray, each terminated by 0x00.
+
+    Appends to ``out`` if given, so a sender can reuse one buffer.
+    """
+    if out is None:
+        out = bytearray()
+    for payload in payloads:
+        _encode_into(out, payload)
+        out.append(DELIMITER)
+    return out
+
+
+def decode(data):
+    """Decode one COBS block (without delimiter) back into the payload"""
+    data = bytes(data)
+    n = len(data)
+    out = bytearray()
+    i = 0
+    while i < n:
+        code = data[i]
+        end = i + code
+        if code == 0 or end > n:
+            raise DecodeError(f"Invalid code byte 0x{code:02X} at offset {i}")
+        out += data[i + 1:end]
+        i = end
+        if code != 0xFF and i < n:
+            out.append(0)
+    return bytes(out)
+
+
+def _decode_in_place(buf, start, end):
+    """Decode buf[start:end] in place and return the decoded (start, end).
+
+    Without 0xFF blocks the decoded frame is the encoded frame shifted by one
+    byte with every inner code byte replaced by 0x00, so only the code bytes
+    are touched. Frames containing 0xFF blocks are compacted with memmove.
+    Returns None for a malformed frame.
+    """
+    i = start
+    compact = False
+    while i < end:
+        code = buf[i]
+        nxt = i + code
+        if nxt > end:
+            return None
+        if code == 0xFF:
+            compact = True
+        i = nxt
+
+    if not compact:
+        i = start
+        code = buf[i]
+        while True:
+            i += code
+            if i >= end:
+                break
+            code = buf[i]
+            buf[i] = 0
+        return start + 1, end
+
+    mv = memoryview(buf)
+    r = start
+    w = start
+    while r < end:
+        code = buf[r]
+        n = code - 1
+        mv[w:w + n] = mv[r + 1:r + code]
+        w += n
+        r += code
+        if code != 0xFF and r < end:
+            buf[w] = 0
+            w += 1
+    mv.release()
+    return start, w
+
+
+class StreamDecoder:
+    """Incremental COBS decoder for a byte stream split into arbitrary chunks.
+
+    ``feed`` accepts any bytes-like object (bytes, bytearray, memoryview, mmap
+    slice) and yields each complete frame as a memoryview into an internal
+    buffer. Frames are decoded in place, nothing is copied per frame. A
+    yielded view is only valid until the next frame is pulled from the
+    decoder; copy it with ``bytes(view)`` to keep it longer.
+
+    Frames longer than ``max_frame`` are dropped up to the next delimiter
+    and malformed frames are skipped. The firmware receive loop differs
+    here: it restarts rxIndex on overflow and keeps the tail of the frame
+    (emulated by loopback.FirmwareReceiver). With ``frame_size`` set, frames
+    of any other decoded length are dropped too (the
+    ``len == sizeof(CanFrame)`` check in UserMain.cpp).
+    """
+
+    def __init__(self, max_frame=4096, frame_size=None):
+        if max_frame < 1:
+            raise ValueError("max_frame must be positive")
+        self.max_frame = max_frame
+        self.frame_size = frame_size
+        self._buf = bytearray(max(4 * max_frame, 65536))
+        self._mv = memoryview(self._buf)
+        self._start = 0      # first byte of the pending frame
+        self._end = 0        # end of valid data
+        self._skipping = False
+        self.frames = 0
+        self.errors = 0
+        self.overflows = 0
+
+    def reset(self):
+        self._start = self._end = 0
+        self._skipping = False
+
+    def feed(self, chunk):
+        chunk = memoryview(chunk).cast("B")
+        size = len(self._buf)
+        pos = 0
+        while pos < len(chunk):
+            # Move the partial frame to the front to make room
+            if self._start:
+                pending = self._end - self._start
+                self._mv[:pending] = self._mv[self._start:self._end]
+                self._start, self._end = 0, pending
+
+            take = min(len(chunk) - pos, size - self._end)
+            self._mv[self._end:self._end + take] = chunk[pos:pos + take]
+            pos += take
+            scan = self._end
+            self._end += take
+            yield from self._drain(scan)
+
+    def _drain(self, scan):
+        buf = self._buf
+        end = self._end
+        while True:
+            zero = buf.find(0, scan, end)
+            if zero < 0:
+                break
+            start = self._start
+            self._start = scan = zero + 1
+
+            if self._skipping:
+                self._skipping = False
+                continue
+            if zero == start:
+                continue
+            if zero - start > self.max_frame:
+                self.overflows += 1
+                continue
+
+            span = _decode_in_place(buf, start, zero)
+            if span is None:
+                self.errors += 1
+                continue
+            a, b = span
+            if self.frame_size is not None and b - a != self.frame_size:
+                self.errors += 1
+                continue
+            self.frames += 1
+            yield self._mv[a:b]
+
+        # Oversized partial frame: discard until the next delimiter
+        if end - self._start > self.max_frame:
+            self.overflows += 1
+            self._skipping = True
+            self._start = end
+
+
+def _benchmark(frame_size=16, count=200_000):
+    import os
+
+    payloads = [os.urandom(frame_size) for _ in range(1024)]
+    frames = [payloads[i % len(payloads)] for i in range(count)]
+
+    t0 = time.perf_counter()
+    wire = encode_frames(frames)
+    t_enc = time.perf_counter() - t0
+
+    decoder = StreamDecoder(frame_size=frame_size)
+    view = memoryview(wire)
+    t0 = time.perf_counter()
+    decoded = 0
+    for offset in range(0, len(wire), 4096):
+        for _ in decoder.feed(view[offset:offset + 4096]):
+            decoded += 1
+    t_dec = time.perf_counter() - t0
+
+    line_rate = 1_500_000 / 10
+    print(f"frame size          {frame_size} bytes, {count} frames, {len(wire)} bytes on the wire")
+    print(f"encode_frames       {count * frame_size / t_enc / 1e6:6.2f} MB/s payload, {count / t_enc:10.0f} frames/s")
+    print(f"StreamDecoder.feed  {len(wire) / t_dec / 1e6:6.2f} MB/s wire,    {decoded / t_dec:10.0f} frames/s")
+    print(f"real time factor    {len(wire) / t_dec / line_rate:6.1f}x at 1.5 Mbaud 8N1")
+
+
+if __name__ == "__main__":
+    _benchmark()
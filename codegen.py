@@ -0,0 +1,1014 @@
+"""Code engine for the CanFrame blocks, shared by generator.py, app.py and batch.py.
+
+final_vars is the list of (cpp_type, cs_type, name) tuples the front-ends
+collect from their variable rows. The module has no UI imports and imports
+rewrite only when files are written, so scripted use starts fast.
+"""
+
+import canbus
+import layout
+
+# Datatype mapping: label -> (C++ type, C# type)
+TYPE_MAPPING = {
+    "int8_t / sbyte": ("int8_t", "sbyte"),
+    "uint8_t / byte": ("uint8_t", "byte"),
+    "int16_t / short": ("int16_t", "short"),
+    "uint16_t / ushort": ("uint16_t", "ushort"),
+    "int32_t / int": ("int32_t", "int"),
+    "uint32_t / uint": ("uint32_t", "uint"),
+    "int64_t / long": ("int64_t", "long"),
+    "uint64_t / ulong": ("uint64_t", "ulong"),
+    "float": ("float", "float"),
+    "double": ("double", "double"),
+    "bool": ("bool", "bool"),
+    # One bit in a shared byte; any integer type takes a width the same way, e.g. uint8_t:4
+    "bool:1 (bit)": ("bool:1", "bool"),
+}
+
+# C# serializer variants for the [GENERATED_SERIALIZE] block
+#   list: List<byte> + BitConverter.GetBytes per field (original emitter)
+#   span: writes into a caller-provided Span<byte>, no allocation per field
+CS_SERIALIZERS = ("list", "span")
+DEFAULT_CS_SERIALIZER = "list"
+
+# Frame modes
+#   full:  every payload is the whole CanFrame
+#   delta: header byte + presence mask + only the items that changed since the
+#          previous payload; every keyframe_interval-th payload is a keyframe
+#          (header + whole frame) so a receiver resynchronizes after a loss
+FRAME_MODES = ("full", "delta")
+DEFAULT_FRAME_MODE = "full"
+DEFAULT_KEYFRAME_INTERVAL = 20
+
+# Little-endian writer for every C# type of the span serializer; BinaryPrimitives is
+# fully qualified because the generated block cannot add a using directive
+_SPAN_WRITERS = {
+    "sbyte": "destination[{off}] = (byte)frame.{name};",
+    "byte": "destination[{off}] = frame.{name};",
+    "bool": "destination[{off}] = frame.{name} ? (byte)1 : (byte)0;",
+    "short": "System.Buffers.Binary.BinaryPrimitives.WriteInt16LittleEndian(destination.Slice({off}, 2), frame.{name});",
+    "ushort": "System.Buffers.Binary.BinaryPrimitives.WriteUInt16LittleEndian(destination.Slice({off}, 2), frame.{name});",
+    "int": "System.Buffers.Binary.BinaryPrimitives.WriteInt32LittleEndian(destination.Slice({off}, 4), frame.{name});",
+    "uint": "System.Buffers.Binary.BinaryPrimitives.WriteUInt32LittleEndian(destination.Slice({off}, 4), frame.{name});",
+    "long": "System.Buffers.Binary.BinaryPrimitives.WriteInt64LittleEndian(destination.Slice({off}, 8), frame.{name});",
+    "ulong": "System.Buffers.Binary.BinaryPrimitives.WriteUInt64LittleEndian(destination.Slice({off}, 8), frame.{name});",
+    "float": "System.Buffers.Binary.BinaryPrimitives.WriteSingleLittleEndian(destination.Slice({off}, 4), frame.{name});",
+    "double": "System.Buffers.Binary.BinaryPrimitives.WriteDoubleLittleEndian(destination.Slice({off}, 8), frame.{name});",
+}
+
+
+def final_vars_from_rows(rows):
+    """final_vars of {"cpp", "cs", "name"} dicts or (cpp, cs, name) rows; incomplete rows are skipped"""
+    final_vars = []
+    for row in rows:
+        cpp, cs, name = (row.get('cpp'), row.get('cs'), row.get('name')) if isinstance(row, dict) else row
+        cpp, cs, name = (cpp or "").strip(), (cs or "").strip(), (name or "").strip()
+        if cpp and cs and name:
+            final_vars.append((cpp, cs, name))
+    return final_vars
+
+
+def _layout(final_vars):
+    """The generate_* functions take final_vars or an already computed FrameLayout"""
+    if isinstance(final_vars, layout.FrameLayout):
+        return final_vars
+    return layout.compute_layout(final_vars)
+
+
+def generate_code(final_vars, serializer=DEFAULT_CS_SERIALIZER, frame_mode=DEFAULT_FRAME_MODE,
+                  keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, can_mode=canbus.DEFAULT_CAN_MODE,
+                  can_base_id=canbus.DEFAULT_CAN_BASE_ID):
+    """All generated blocks of one variable list"""
+    if frame_mode not in FRAME_MODES:
+        raise ValueError(f"Unknown frame mode: {frame_mode}")
+    keyframe_interval = int(keyframe_interval)
+    if keyframe_interval < 1:
+        raise ValueError("keyframe_interval must be at least 1")
+    if can_mode not in canbus.CAN_MODES:
+        raise ValueError(f"Unknown CAN mode: {can_mode}")
+    frame_layout = layout.compute_layout(final_vars, delta=frame_mode == "delta")
+    mapping = canbus.map_messages(frame_layout, can_mode, can_base_id) if can_mode != "off" else None
+    code = {
+        "cs_struct": generate_cs_struct(frame_layout),
+        "cs_serialize": generate_cs_serialize(frame_layout, serializer),
+        "cs_send": generate_cs_send(frame_layout, serializer),
+        "cpp_struct": generate_cpp_struct(frame_layout),
+        "py_module": generate_python_module(frame_layout, keyframe_interval, mapping),
+    }
+    if frame_layout.delta:
+        code["cs_serialize"] += "\n\n" + generate_cs_delta(frame_layout, serializer, keyframe_interval)
+        code["cpp_struct"] += "\n\n" + generate_cpp_delta(frame_layout)
+    if mapping:
+        code["cpp_struct"] += "\n\n" + generate_cpp_can(frame_layout, mapping)
+    return code
+
+
+def rewrite_plan(code, path_cs, path_cpp, plan=None):
+    """Marker regions of generate_code() per target file, for rewrite.rewrite_files"""
+    import rewrite
+    plan = {} if plan is None else plan
+    plan.setdefault(path_cs, []).extend([
+        rewrite.Region("// [GENERATED_STRUCT_START]", "// [GENERATED_STRUCT_END]", code["cs_struct"]),
+        rewrite.Region("// [GENERATED_SERIALIZE_START]", "// [GENERATED_SERIALIZE_END]", code["cs_serialize"]),
+        rewrite.Region("// [GENERATED_SEND_START]", "// [GENERATED_SEND_END]", code["cs_send"], optional=True),
+    ])
+    plan.setdefault(path_cpp, []).append(
+        rewrite.Region("// [GENERATED_STRUCT_START]", "// [GENERATED_STRUCT_END]", code["cpp_struct"]))
+    return plan
+
+
+def write_code(code, path_cs, path_cpp, path_py=None):
+    """Write generate_code() into the target files; {path: written}.
+
+    All regions of a file are replaced in one pass and nothing is written
+    unless every file renders. The Python module is generated as a whole.
+    """
+    import rewrite
+    written = rewrite.rewrite_files(rewrite_plan(code, path_cs, path_cpp))
+    if path_py:
+        written[path_py] = rewrite.write_if_changed(path_py, code["py_module"])
+    return written
+
+
+def _shift(run, field):
+    """Position of a bit field in its run"""
+    return (field.offset - run.offset) * 8 + field.bit
+
+
+def _is_signed(cpp_type):
+    return layout.PY_FORMATS[cpp_type][0].islower()
+
+
+def generate_cs_struct(final_vars):
+    frame_layout = _layout(final_vars)
+    cs_struct = "public struct CanFrame {\n"
+    cs_struct += f"    public const int Size = {frame_layout.size};\n"
+    for field in frame_layout.fields:
+        cs_struct += f"    public {field.cs_type} {field.name};\n"
+    cs_struct += "}"
+    return cs_struct
+
+
+def generate_cpp_struct(final_vars):
+    """Packed struct, its wire size and CanFrame_Unpack for the receiver.
+
+    Without bit fields the struct is the wire format and CanFrame_Unpack is
+    a memcpy. Bit fields are real C++ bit fields in the struct, but their
+    in-memory layout is up to the compiler, so CanFrame_Unpack extracts them
+    from the payload explicitly and the struct needs no packing (GCC warns
+    about packed bit fields).
+    """
+    frame_layout = _layout(final_vars)
+    cpp_struct = "struct CanFrame {\n" if frame_layout.has_bits else "struct __attribute__((packed)) CanFrame {\n"
+    for field in frame_layout.fields:
+        width = f" : {field.bits}" if field.bits else ""
+        cpp_struct += f"    {field.cpp_type} {field.name}{width};\n"
+    cpp_struct += "};\n"
+    if not frame_layout.has_bits:
+        cpp_struct += f'static_assert(sizeof(CanFrame) == {frame_layout.size}, "CanFrame does not match the generated layout");\n'
+    cpp_struct += f"static constexpr size_t CanFrameWireSize = {frame_layout.size};\n"
+    cpp_struct += "\n// Fills frame from a decoded payload of CanFrameWireSize bytes\n"
+    cpp_struct += "static inline void CanFrame_Unpack(const uint8_t* data, CanFrame* frame) {\n"
+    if not frame_layout.has_bits:
+        cpp_struct += "    memcpy(frame, data, sizeof(CanFrame));\n}"
+        return cpp_struct
+    for item in frame_layout.items:
+        if isinstance(item, layout.Field):
+            cpp_struct += f"    memcpy(&frame->{item.name}, data + {item.offset}, sizeof(frame->{item.name}));\n"
+            continue
+        var = f"bits{item.offset}"
+        cpp_struct += f"    uint64_t {var} = 0;\n"
+        cpp_struct += f"    for (int i = 0; i < {item.size}; i++) {var} |= (uint64_t)data[{item.offset} + i] << (8 * i);\n"
+        for field in item.fields:
+            value = f"(({var} >> {_shift(item, field)}) & 0x{(1 << field.bits) - 1:X}ull)"
+            if field.cpp_type == "bool":
+                value = f"{value} != 0"
+            elif _is_signed(field.cpp_type) and field.bits < layout.CPP_TYPE_SIZES[field.cpp_type] * 8:
+                # Sign extension of the field's top bit
+                sign = 1 << (field.bits - 1)
+                value = f"({field.cpp_type})((int64_t)({value} ^ 0x{sign:X}ull) - 0x{sign:X}ll)"
+            else:
+                value = f"({field.cpp_type}){value}"
+            cpp_struct += f"    frame->{field.name} = {value};\n"
+    cpp_struct += "}"
+    return cpp_struct
+
+
+def generate_cpp_delta(final_vars):
+    """CanFrame_ApplyDelta for the receiver of delta mode payloads.
+
+    The state keeps the last complete wire image; a delta patches the items
+    whose mask bit is set and CanFrame_Unpack turns the image into the
+    struct. After a lost frame (sequence gap) or a malformed payload every
+    delta is rejected until the next keyframe.
+    """
+    frame_layout = _layout(final_vars)
+    offsets = ", ".join(str(item.offset) for item in frame_layout.items)
+    sizes = ", ".join(str(item.size) for item in frame_layout.items)
+    return _CPP_DELTA.format(mask_size=frame_layout.mask_size, count=len(frame_layout.items),
+                             offsets=offsets, sizes=sizes)
+
+
+_CPP_DELTA = """// Delta mode: header byte (bit 7 = keyframe, bits 0-6 = sequence), then either
+// the whole frame or a presence mask (one bit per item, LSB first) and the changed items
+static constexpr size_t CanFrameDeltaMaxSize = CanFrameWireSize + 1;
+static constexpr size_t CanFrameDeltaMaskSize = {mask_size};
+static constexpr size_t CanFrameDeltaItems = {count};
+static const uint16_t CanFrameDeltaOffsets[CanFrameDeltaItems] = {{ {offsets} }};
+static const uint8_t CanFrameDeltaSizes[CanFrameDeltaItems] = {{ {sizes} }};
+
+struct CanFrameDeltaState {{
+    uint8_t wire[CanFrameWireSize];  // last complete payload
+    uint8_t sequence;                // sequence number of the next payload
+    bool synced;                     // false until the first keyframe and after a lost frame
+}};
+
+// Merges one decoded payload into frame; false (frame untouched) if it is malformed
+// or a delta arrives out of sync, which lasts until the next keyframe
+static inline bool CanFrame_ApplyDelta(CanFrameDeltaState* state, const uint8_t* data, size_t len, CanFrame* frame) {{
+    if (len == 0) return false;
+    uint8_t header = data[0];
+    if (header & 0x80) {{
+        if (len != CanFrameDeltaMaxSize) return false;
+        memcpy(state->wire, data + 1, CanFrameWireSize);
+    }} else {{
+        if (!state->synced || header != state->sequence || len < 1 + CanFrameDeltaMaskSize) {{
+            state->synced = false;
+            return false;
+        }}
+        const uint8_t* mask = data + 1;
+        size_t pos = 1 + CanFrameDeltaMaskSize;
+        for (size_t i = 0; i < CanFrameDeltaItems; i++) {{
+            if (!((mask[i >> 3] >> (i & 7)) & 1)) continue;
+            if (pos + CanFrameDeltaSizes[i] > len) {{
+                state->synced = false;
+                return false;
+            }}
+            memcpy(state->wire + CanFrameDeltaOffsets[i], data + pos, CanFrameDeltaSizes[i]);
+            pos += CanFrameDeltaSizes[i];
+        }}
+        if (pos != len) {{
+            state->synced = false;
+            return false;
+        }}
+    }}
+    state->synced = true;
+    state->sequence = (header + 1) & 0x7F;
+    CanFrame_Unpack(state->wire, frame);
+    return true;
+}}"""
+
+
+def generate_cpp_can(final_vars, mapping):
+    """CAN segmentation for the firmware: CanFrame_Pack, CanFrame_SegmentMessage and CanFrame_Reassemble.
+
+    The sender packs the frame into its wire image once and copies each
+    message's items out of it; the reassembler copies them back and unpacks
+    the image when the last message of a frame arrived in order.
+    """
+    frame_layout = _layout(final_vars)
+    kind = "CAN FD" if mapping.bus == "fd" else "classic CAN"
+    lines = [
+        f"// CAN mapping: CanFrame in {len(mapping.messages)} {kind} message(s), sent in index order",
+        f"static constexpr size_t CanFrameMessageCount = {len(mapping.messages)};",
+        f"static constexpr bool CanFrameMessageExtendedId = {'true' if mapping.extended_id else 'false'};",
+        "static const uint32_t CanFrameMessageIds[CanFrameMessageCount] = { "
+        + ", ".join(f"0x{m.id:X}" for m in mapping.messages) + " };",
+        "static const uint8_t CanFrameMessageLengths[CanFrameMessageCount] = { "
+        + ", ".join(str(m.length) for m in mapping.messages) + " };",
+        "",
+        "// Wire image of frame (CanFrameWireSize bytes), the inverse of CanFrame_Unpack",
+        "static inline void CanFrame_Pack(const CanFrame* frame, uint8_t* data) {",
+    ]
+    if not frame_layout.has_bits:
+        lines.append("    memcpy(data, frame, sizeof(CanFrame));")
+    for item in frame_layout.items if frame_layout.has_bits else ():
+        if isinstance(item, layout.Field):
+            lines.append(f"    memcpy(data + {item.offset}, &frame->{item.name}, sizeof(frame->{item.name}));")
+            continue
+        var = f"bits{item.offset}"
+        lines.append(f"    uint64_t {var} = 0;")
+        for field in item.fields:
+            if field.cpp_type == "bool":
+                value = f"(uint64_t)(frame->{field.name} ? 1 : 0)"
+            else:
+                # Signed values keep their two's complement bits
+                value = f"((uint64_t)frame->{field.name} & 0x{(1 << field.bits) - 1:X}ull)"
+            shift = _shift(item, field)
+            lines.append(f"    {var} |= {value} << {shift};" if shift else f"    {var} |= {value};")
+        lines.append(f"    for (int i = 0; i < {item.size}; i++) data[{item.offset} + i] = (uint8_t)({var} >> (8 * i));")
+    lines += [
+        "}",
+        "",
+        "// Data of message index from the wire image of CanFrame_Pack; returns its length",
+        "static inline uint8_t CanFrame_SegmentMessage(const uint8_t* wire, size_t index, uint8_t* data) {",
+        "    switch (index) {",
+    ]
+    for message in mapping.messages:
+        lines.append(f"    case {message.index}:")
+        lines += [f"        memcpy(data + {p.offset}, wire + {p.wire_offset}, {p.size});  // {', '.join(p.names)}"
+                  for p in message.pieces]
+        used = sum(p.size for p in message.pieces)
+        if message.length > used:
+            lines.append(f"        memset(data + {used}, 0, {message.length - used});  // CAN FD padding")
+        lines.append(f"        return {message.length};")
+    lines += [
+        "    default:",
+        "        return 0;",
+        "    }",
+        "}",
+        "",
+        "struct CanFrameReassembly {",
+        "    uint8_t wire[CanFrameWireSize];  // image being collected",
+        "    size_t next;                     // index of the expected message",
+        "};",
+        "",
+        "// Feeds one received message; true when it completed a frame, which is then unpacked",
+        "// into frame. A missing or reordered message drops that frame, so two frames never mix",
+        "static inline bool CanFrame_Reassemble(CanFrameReassembly* state, uint32_t id, const uint8_t* data, uint8_t len, CanFrame* frame) {",
+        f"    uint32_t index = id - 0x{mapping.base_id:X}u;  // IDs below the first wrap around",
+        "    if (index >= CanFrameMessageCount) return false;",
+        "    if (index != 0 && index != state->next) {",
+        "        state->next = 0;",
+        "        return false;",
+        "    }",
+        "    if (len != CanFrameMessageLengths[index]) {",
+        "        state->next = 0;",
+        "        return false;",
+        "    }",
+        "    switch (index) {",
+    ]
+    for message in mapping.messages:
+        lines.append(f"    case {message.index}:")
+        lines += [f"        memcpy(state->wire + {p.wire_offset}, data + {p.offset}, {p.size});" for p in message.pieces]
+        lines.append("        break;")
+    lines += [
+        "    }",
+        "    state->next = index + 1;",
+        "    if (state->next < CanFrameMessageCount) return false;",
+        "    state->next = 0;",
+        "    CanFrame_Unpack(state->wire, frame);",
+        "    return true;",
+        "}",
+    ]
+    return "\n".join(lines)
+
+
+def generate_cs_serialize(final_vars, serializer=DEFAULT_CS_SERIALIZER):
+    if serializer == "list":
+        return _generate_cs_serialize_list(final_vars)
+    if serializer == "span":
+        return _generate_cs_serialize_span(final_vars)
+    raise ValueError(f"Unknown C# serializer: {serializer}")
+
+
+def _cs_pack_run(run):
+    """(variable, statements) collecting a BitRun in a ulong, LSB first"""
+    var = f"bits{run.offset}"
+    lines = [f"ulong {var} = 0;"]
+    for field in run.fields:
+        if field.cs_type == "bool":
+            value = f"(frame.{field.name} ? 1UL : 0UL)"
+        else:
+            # unchecked: negative values keep their two's complement bits
+            value = f"(unchecked((ulong)frame.{field.name}) & 0x{(1 << field.bits) - 1:X}UL)"
+        shift = _shift(run, field)
+        lines.append(f"{var} |= {value} << {shift};" if shift else f"{var} |= {value};")
+    return var, lines
+
+
+def _generate_cs_serialize_list(final_vars):
+    cs_serialize = "    private static byte[] SerializeFrame(CanFrame frame) {\n        List<byte> bytes = new List<byte>();\n"
+    for item in _layout(final_vars).items:
+        if isinstance(item, layout.Field):
+            cs_serialize += f"        bytes.AddRange(BitConverter.GetBytes(frame.{item.name}));\n"
+            continue
+        var, lines = _cs_pack_run(item)
+        lines += [f"bytes.Add((byte)({var} >> {8 * i}));" if i else f"bytes.Add((byte){var});" for i in range(item.size)]
+        cs_serialize += "".join(f"        {line}\n" for line in lines)
+    cs_serialize += "        return bytes.ToArray();\n    }"
+    return cs_serialize
+
+
+def _generate_cs_serialize_span(final_vars):
+    """SerializeFrame writing each field little-endian at its packed offset.
+
+    The byte[] overload keeps existing callers of SerializeFrame(frame)
+    compiling with a single allocation per frame.
+    """
+    writes = []
+    for item in _layout(final_vars).items:
+        if isinstance(item, layout.Field):
+            writes.append("        " + _SPAN_WRITERS[item.cs_type].format(off=item.offset, name=item.name))
+            continue
+        var, lines = _cs_pack_run(item)
+        lines += [f"destination[{item.offset + i}] = (byte)({var} >> {8 * i});" if i
+                  else f"destination[{item.offset}] = (byte){var};" for i in range(item.size)]
+        writes += ["        " + line for line in lines]
+
+    lines = [
+        "public const int FrameSize = CanFrame.Size;",
+        "",
+        "    private static int SerializeFrame(in CanFrame frame, Span<byte> destination) {",
+        "        if (destination.Length < FrameSize) throw new ArgumentException(\"Buffer too small for CanFrame\", nameof(destination));",
+        *writes,
+        "        return FrameSize;",
+        "    }",
+        "",
+        "    private static byte[] SerializeFrame(CanFrame frame) {",
+        "        byte[] bytes = new byte[FrameSize];",
+        "        SerializeFrame(frame, bytes);",
+        "        return bytes;",
+        "    }",
+    ]
+    return "\n".join(lines)
+
+
+def generate_cs_send(final_vars, serializer=DEFAULT_CS_SERIALIZER):
+    """SendCanFrame + CobsEncode for the optional [GENERATED_SEND] block.
+
+    The list variant is the original hand-written code. The span variant
+    serializes into a stackalloc buffer and COBS-encodes into an ArrayPool
+    array sized for the worst case, so no allocation happens per frame.
+    """
+    frame_layout = _layout(final_vars)
+    if serializer == "list":
+        send = _CS_SEND_LIST
+        if frame_layout.delta:
+            send = _CS_DELTA_ENCODER_FIELD + send.replace(_CS_SEND_LIST_STEP1, _CS_SEND_LIST_DELTA_STEP1)
+        return send
+    if serializer == "span":
+        send = _CS_SEND_SPAN.replace("{encoded_size}", str(frame_layout.wire_size))
+        if frame_layout.delta:
+            send = _CS_DELTA_ENCODER_FIELD + send.replace(_CS_SEND_SPAN_STEP1, _CS_SEND_SPAN_DELTA_STEP1)
+        return send
+    raise ValueError(f"Unknown C# serializer: {serializer}")
+
+
+_CS_SEND_LIST_STEP1 = """        // Schritt 1: Das Struct logisch in Bytes zerlegen
+        byte[] payload = SerializeFrame(frame);"""
+
+_CS_SEND_LIST_DELTA_STEP1 = """        // Schritt 1: Nur geänderte Felder kodieren (periodisch den ganzen Frame)
+        byte[] payload = DeltaEncoder.Encode(frame);"""
+
+_CS_SEND_SPAN_STEP1 = """        // Schritt 1: Serialisieren in einen Stack-Puffer
+        Span<byte> payload = stackalloc byte[FrameSize];
+        SerializeFrame(frame, payload);"""
+
+_CS_SEND_SPAN_DELTA_STEP1 = """        // Schritt 1: Nur geänderte Felder kodieren (periodisch den ganzen Frame)
+        Span<byte> payload = stackalloc byte[CanFrameDeltaEncoder.MaxPayloadSize];
+        payload = payload.Slice(0, DeltaEncoder.Encode(frame, payload));"""
+
+_CS_DELTA_ENCODER_FIELD = """private static readonly CanFrameDeltaEncoder DeltaEncoder = new CanFrameDeltaEncoder();
+
+    """
+
+
+def generate_cs_delta(final_vars, serializer=DEFAULT_CS_SERIALIZER, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+    """CanFrameDeltaEncoder, appended to the serialize block in delta mode.
+
+    It compares each serialized frame with the previous one item by item
+    (a bit-field run counts as one item) and falls back to a keyframe when
+    the delta would not be shorter.
+    """
+    frame_layout = _layout(final_vars)
+    if serializer not in CS_SERIALIZERS:
+        raise ValueError(f"Unknown C# serializer: {serializer}")
+    encode = _CS_DELTA_ENCODE_SPAN if serializer == "span" else _CS_DELTA_ENCODE_LIST
+    return (_CS_DELTA_ENCODER
+            .replace("{interval}", str(int(keyframe_interval)))
+            .replace("{mask_size}", str(frame_layout.mask_size))
+            .replace("{offsets}", ", ".join(str(item.offset) for item in frame_layout.items))
+            .replace("{sizes}", ", ".join(str(item.size) for item in frame_layout.items))
+            .replace("{encode}", encode))
+
+
+_CS_DELTA_ENCODER = """    // Delta mode: header byte (bit 7 = keyframe, bits 0-6 = sequence), then either
+    // the whole frame or a presence mask (one bit per item, LSB first) and the changed items
+    public sealed class CanFrameDeltaEncoder
+    {
+        // Every KeyframeInterval-th payload is a keyframe, so the receiver resynchronizes after a lost frame
+        public const int KeyframeInterval = {interval};
+        public const int MaskSize = {mask_size};
+        public const int MaxPayloadSize = CanFrame.Size + 1;
+        private static readonly int[] Offsets = { {offsets} };
+        private static readonly int[] Sizes = { {sizes} };
+
+        private readonly byte[] previous = new byte[CanFrame.Size];
+        private int sinceKeyframe = KeyframeInterval;
+        private byte sequence;
+
+        // The next payload is a keyframe, e.g. after the port was reopened
+        public void RequestKeyframe()
+        {
+            sinceKeyframe = KeyframeInterval;
+        }
+{encode}
+    }"""
+
+_CS_DELTA_ENCODE_LIST = """
+        public byte[] Encode(CanFrame frame)
+        {
+            byte[] current = SerializeFrame(frame);
+            byte header = sequence;
+            sequence = (byte)((sequence + 1) & 0x7F);
+
+            List<byte> payload = new List<byte>(MaxPayloadSize);
+            payload.Add(header);
+            payload.AddRange(new byte[MaskSize]);
+            bool keyframe = sinceKeyframe >= KeyframeInterval || payload.Count >= MaxPayloadSize;
+            for (int i = 0; i < Offsets.Length && !keyframe; i++)
+            {
+                if (SameBytes(current, previous, Offsets[i], Sizes[i])) continue;
+                if (payload.Count + Sizes[i] >= MaxPayloadSize)
+                {
+                    keyframe = true;  // the delta would not be shorter
+                    break;
+                }
+                payload[1 + (i >> 3)] |= (byte)(1 << (i & 7));
+                for (int j = 0; j < Sizes[i]; j++) payload.Add(current[Offsets[i] + j]);
+            }
+            Array.Copy(current, previous, current.Length);
+
+            if (keyframe)
+            {
+                payload.Clear();
+                payload.Add((byte)(0x80 | header));
+                payload.AddRange(current);
+                sinceKeyframe = 1;
+            }
+            else
+            {
+                sinceKeyframe++;
+            }
+            return payload.ToArray();
+        }
+
+        private static bool SameBytes(byte[] a, byte[] b, int offset, int count)
+        {
+            for (int i = offset; i < offset + count; i++)
+            {
+                if (a[i] != b[i]) return false;
+            }
+            return true;
+        }"""
+
+_CS_DELTA_ENCODE_SPAN = """
+        // Writes the payload into destination (at least MaxPayloadSize bytes) and returns its length
+        public int Encode(in CanFrame frame, Span<byte> destination)
+        {
+            if (destination.Length < MaxPayloadSize) throw new ArgumentException("Buffer too small for the delta payload", nameof(destination));
+            Span<byte> current = stackalloc byte[CanFrame.Size];
+            SerializeFrame(frame, current);
+            byte header = sequence;
+            sequence = (byte)((sequence + 1) & 0x7F);
+
+            int length = 1 + MaskSize;
+            bool keyframe = sinceKeyframe >= KeyframeInterval || length >= MaxPayloadSize;
+            if (!keyframe)
+            {
+                Span<byte> mask = destination.Slice(1, MaskSize);
+                mask.Clear();
+                for (int i = 0; i < Offsets.Length; i++)
+                {
+                    ReadOnlySpan<byte> item = current.Slice(Offsets[i], Sizes[i]);
+                    if (item.SequenceEqual(previous.AsSpan(Offsets[i], Sizes[i]))) continue;
+                    if (length + Sizes[i] >= MaxPayloadSize)
+                    {
+                        keyframe = true;  // the delta would not be shorter
+                        break;
+                    }
+                    mask[i >> 3] |= (byte)(1 << (i & 7));
+                    item.CopyTo(destination.Slice(length));
+                    length += Sizes[i];
+                }
+            }
+            current.CopyTo(previous);
+
+            if (keyframe)
+            {
+                destination[0] = (byte)(0x80 | header);
+                current.CopyTo(destination.Slice(1));
+                sinceKeyframe = 1;
+                return MaxPayloadSize;
+            }
+            destination[0] = header;
+            sinceKeyframe++;
+            return length;
+        }
+
+        public byte[] Encode(CanFrame frame)
+        {
+            Span<byte> payload = stackalloc byte[MaxPayloadSize];
+            return payload.Slice(0, Encode(frame, payload)).ToArray();
+        }"""
+
+
+_CS_SEND_LIST = """public static void SendCanFrame(SerialPort serialPort, CanFrame frame)
+    {
+        // Schritt 1: Das Struct logisch in Bytes zerlegen
+        byte[] payload = SerializeFrame(frame);
+
+        // Schritt 2: COBS-Kodierung (Byte-für-Byte Bearbeitung)
+        byte[] encoded = CobsEncode(payload);
+
+        // Schritt 3: Absenden
+        serialPort.Write(encoded, 0, encoded.Length);
+    }
+    public static byte[] CobsEncode(byte[] input)
+    {
+        List<byte> output = new List<byte>();
+        output.Add(0);
+        int codeIndex = 0;
+        byte code = 1;
+
+        foreach (byte b in input)
+        {
+            if (b == 0)
+            {
+                output[codeIndex] = code;
+                code = 1;
+                codeIndex = output.Count;
+                output.Add(0);
+            }
+            else
+            {
+                output.Add(b);
+                code++;
+            }
+        }
+        output[codeIndex] = code;
+        output.Add(0x00); // Zero-Terminator
+        return output.ToArray();
+    }"""
+
+_CS_SEND_SPAN = """// Worst-case COBS size of one frame including the 0x00 terminator
+    public const int EncodedFrameSize = {encoded_size};
+
+    public static void SendCanFrame(SerialPort serialPort, CanFrame frame)
+    {
+        // Schritt 1: Serialisieren in einen Stack-Puffer
+        Span<byte> payload = stackalloc byte[FrameSize];
+        SerializeFrame(frame, payload);
+
+        // Schritt 2: COBS-Kodierung direkt in einen Pool-Puffer
+        byte[] encoded = System.Buffers.ArrayPool<byte>.Shared.Rent(EncodedFrameSize);
+        try
+        {
+            int length = CobsEncode(payload, encoded);
+
+            // Schritt 3: Absenden
+            serialPort.Write(encoded, 0, length);
+        }
+        finally
+        {
+            System.Buffers.ArrayPool<byte>.Shared.Return(encoded);
+        }
+    }
+
+    // Encodes input into output (incl. 0x00 terminator), returns the encoded length.
+    // output must hold at least input.Length + input.Length / 254 + 2 bytes.
+    public static int CobsEncode(ReadOnlySpan<byte> input, Span<byte> output)
+    {
+        int codeIndex = 0;
+        int writeIndex = 1;
+        byte code = 1;
+
+        for (int i = 0; i < input.Length; i++)
+        {
+            byte b = input[i];
+            if (b != 0)
+            {
+                output[writeIndex++] = b;
+                code++;
+            }
+            if (b == 0 || code == 0xFF)
+            {
+                output[codeIndex] = code;
+                code = 1;
+                codeIndex = writeIndex;
+                if (b == 0 || i + 1 < input.Length) writeIndex++;
+            }
+        }
+        output[codeIndex] = code;
+        output[writeIndex++] = 0x00; // Zero-Terminator
+        return writeIndex;
+    }"""
+
+
+def generate_python_module(final_vars, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, mapping=None):
+    """Standalone Python module with pack/unpack and a NumPy dtype for CanFrame.
+
+    The layout is baked in as literals so the module has no dependency on the
+    generator; NumPy is only imported when the dtype is first used. Bit
+    fields get generated shift/mask code, byte-aligned frames keep the plain
+    struct.Struct fast path. In delta mode the module also gets DeltaEncoder
+    and DeltaDecoder, byte-exact references of the C# and C++ side; with a
+    canbus.CanMapping it gets segment() and Reassembler like the firmware.
+    """
+    frame_layout = _layout(final_vars)
+    names = tuple(f.name for f in frame_layout.fields)
+    fields = ",\n".join(f"    {tuple(f)!r}" for f in frame_layout.fields)
+    bit_fields = {}
+    for item in frame_layout.items:
+        if isinstance(item, layout.BitRun):
+            for f in item.fields:
+                bit_fields[f.name] = (f"_bits{item.offset}", _shift(item, f), f.bits, layout.PY_FORMATS[f.cpp_type][1])
+    return _PY_MODULE.format(
+        fields=fields + ",\n" if fields else "",
+        names=names,
+        format=frame_layout.struct_format,
+        size=frame_layout.size,
+        codec=_py_bit_codec(frame_layout) if frame_layout.has_bits else _PY_CODEC,
+        descr=frame_layout.numpy_descr,
+        bit_fields=bit_fields,
+    ) + (_PY_DELTA.format(
+        interval=int(keyframe_interval),
+        mask_size=frame_layout.mask_size,
+        items=tuple((item.offset, item.size) for item in frame_layout.items),
+    ) if frame_layout.delta else "") + (_PY_CAN.format(
+        bus=mapping.bus,
+        extended=mapping.extended_id,
+        messages="".join(f"    ({m.id:#x}, {m.length}, {tuple((p.offset, p.wire_offset, p.size) for p in m.pieces)!r}),\n"
+                         for m in mapping.messages),
+    ) if mapping else "")
+
+
+def _py_bit_codec(frame_layout):
+    """pack/unpack of a frame with bit fields; values are truncated to their width like in C#"""
+    wire, values, runs = [], [], []
+    k = 0
+    for j, item in enumerate(frame_layout.items):
+        if isinstance(item, layout.Field):
+            wire.append(f"frame[{k}]")
+            values.append(f"v[{j}]")
+            k += 1
+            continue
+        terms = []
+        for f in item.fields:
+            shift, mask = _shift(item, f), (1 << f.bits) - 1
+            value = f"(1 if frame[{k}] else 0)" if f.cpp_type == "bool" else f"(frame[{k}] & {mask:#x})"
+            terms.append(f"{value} << {shift}" if shift else value)
+            extracted = f"r{j} >> {shift} & {mask:#x}" if shift else f"r{j} & {mask:#x}"
+            if f.cpp_type == "bool":
+                extracted = f"bool({extracted})"
+            elif _is_signed(f.cpp_type):
+                sign = 1 << (f.bits - 1)
+                extracted = f"(({extracted}) ^ {sign:#x}) - {sign:#x}"
+            values.append(extracted)
+            k += 1
+        merged = terms[0] if len(terms) == 1 and " << " not in terms[0] else f"({' | '.join(terms)})"
+        wire.append(f"{merged}.to_bytes({item.size}, 'little')")
+        runs.append(f"    r{j} = int.from_bytes(v[{j}], 'little')\n")
+    return _PY_BIT_CODEC.format(
+        wire="".join(f"        {w},\n" for w in wire),
+        runs="".join(runs),
+        values="".join(f"        {v},\n" for v in values),
+    )
+
+
+_PY_MODULE = '''"""CanFrame pack/unpack, generated by the CAN Frame Generator. Do not edit.
+
+    frame = unpack(payload)             # one decoded (COBS-free) frame
+    payload = pack(frame)
+    frames = frombuffer(capture)        # NumPy structured array, one call
+    values = field(frames, "name")      # one column, bit fields extracted
+"""
+
+import struct
+from collections import namedtuple
+
+# (name, cpp_type, cs_type, offset, size, bit, bits); bit fields have a width in bits
+LAYOUT = (
+{fields})
+FIELDS = {names!r}
+FORMAT = {format!r}
+SIZE = {size}
+
+FRAME_STRUCT = struct.Struct(FORMAT)
+CanFrame = namedtuple("CanFrame", FIELDS)
+
+_pack = FRAME_STRUCT.pack
+_unpack_from = FRAME_STRUCT.unpack_from
+_make = CanFrame._make
+
+{codec}
+NUMPY_DESCR = {descr!r}
+# Bit fields in frombuffer() arrays: name -> (bytes column, shift, width, dtype)
+BIT_FIELDS = {bit_fields!r}
+_dtype = None
+
+
+def dtype():
+    global _dtype
+    if _dtype is None:
+        import numpy as np
+        _dtype = np.dtype(NUMPY_DESCR)
+        assert _dtype.itemsize == SIZE
+    return _dtype
+
+
+def frombuffer(buffer, count=-1, offset=0):
+    """Decode back-to-back payloads into a structured array without copying"""
+    import numpy as np
+    if count < 0:
+        count = (len(buffer) - offset) // SIZE
+    return np.frombuffer(buffer, dtype=dtype(), count=count, offset=offset)
+
+
+def field(frames, name):
+    """One field of a frombuffer() array; bit fields are extracted from their bytes"""
+    if name not in BIT_FIELDS:
+        return frames[name]
+    import numpy as np
+    column, shift, width, result_dtype = BIT_FIELDS[name]
+    raw = frames[column].astype(np.uint64)
+    value = np.zeros(raw.shape[:-1], np.uint64)
+    for i in range(raw.shape[-1]):
+        value |= raw[..., i] << np.uint64(8 * i)
+    value = (value >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+    if np.dtype(result_dtype).kind == "i" and width < 64:
+        sign = np.int64(1 << (width - 1))
+        return ((value.astype(np.int64) ^ sign) - sign).astype(result_dtype)
+    return value.astype(result_dtype)
+'''
+
+_PY_DELTA = '''
+
+# Delta mode: header byte (bit 7 keyframe, bits 0-6 sequence), then either the
+# whole frame or a presence mask (one bit per item, LSB first) and the changed items
+KEYFRAME_INTERVAL = {interval}
+MASK_SIZE = {mask_size}
+MAX_PAYLOAD_SIZE = SIZE + 1
+# (offset, size) of every item; a bit-field run is one item
+ITEMS = {items!r}
+
+
+class DeltaEncoder:
+    """Payloads of the C# CanFrameDeltaEncoder"""
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.previous = bytes(SIZE)
+        self.since_keyframe = keyframe_interval
+        self.sequence = 0
+
+    def request_keyframe(self):
+        self.since_keyframe = self.keyframe_interval
+
+    def encode(self, frame):
+        current = pack(frame)
+        header = self.sequence
+        self.sequence = (header + 1) & 0x7F
+        keyframe = self.since_keyframe >= self.keyframe_interval
+        if not keyframe:
+            previous = self.previous
+            mask, parts, length = 0, [], 1 + MASK_SIZE
+            for i, (offset, size) in enumerate(ITEMS):
+                item = current[offset:offset + size]
+                if item != previous[offset:offset + size]:
+                    mask |= 1 << i
+                    parts.append(item)
+                    length += size
+            # A delta that is not shorter than the frame is sent as keyframe
+            keyframe = length >= MAX_PAYLOAD_SIZE
+        self.previous = current
+        if keyframe:
+            self.since_keyframe = 1
+            return bytes((0x80 | header,)) + current
+        self.since_keyframe += 1
+        return bytes((header,)) + mask.to_bytes(MASK_SIZE, "little") + b"".join(parts)
+
+
+class DeltaDecoder:
+    """Receiver side like CanFrame_ApplyDelta; decode() returns the merged CanFrame,
+    or None for a malformed payload and for deltas after a lost frame until the next keyframe"""
+
+    def __init__(self):
+        self.wire = bytearray(SIZE)
+        self.sequence = 0
+        self.synced = False
+
+    def decode(self, payload):
+        if not payload:
+            return None
+        header = payload[0]
+        if header & 0x80:
+            if len(payload) != MAX_PAYLOAD_SIZE:
+                return None
+            self.wire[:] = payload[1:]
+        else:
+            if not self.synced or header != self.sequence or len(payload) < 1 + MASK_SIZE:
+                self.synced = False
+                return None
+            mask = int.from_bytes(payload[1:1 + MASK_SIZE], "little")
+            pos = 1 + MASK_SIZE
+            for i, (offset, size) in enumerate(ITEMS):
+                if mask >> i & 1:
+                    if pos + size > len(payload):
+                        self.synced = False
+                        return None
+                    self.wire[offset:offset + size] = payload[pos:pos + size]
+                    pos += size
+            if pos != len(payload):
+                self.synced = False
+                return None
+        self.synced = True
+        self.sequence = (header + 1) & 0x7F
+        return unpack(self.wire)
+'''
+
+_PY_CAN = '''
+
+# CAN mapping ({bus}): (id, length, ((message offset, wire offset, size), ...)) per message,
+# sent in this order; bytes beyond the pieces are CAN FD padding
+CAN_MESSAGES = (
+{messages})
+CAN_EXTENDED_ID = {extended}
+_CAN_INDEX = {{can_id: i for i, (can_id, _, _) in enumerate(CAN_MESSAGES)}}
+
+
+def segment(frame):
+    """(id, data) of every CAN message of a frame, like CanFrame_SegmentMessage"""
+    wire = pack(frame)
+    messages = []
+    for can_id, length, pieces in CAN_MESSAGES:
+        data = bytearray(length)
+        for offset, wire_offset, size in pieces:
+            data[offset:offset + size] = wire[wire_offset:wire_offset + size]
+        messages.append((can_id, bytes(data)))
+    return messages
+
+
+class Reassembler:
+    """Receiver side like CanFrame_Reassemble; feed() returns the CanFrame completed by a
+    message, or None. A missing or reordered message drops that frame"""
+
+    def __init__(self):
+        self.wire = bytearray(SIZE)
+        self.next = 0
+
+    def feed(self, can_id, data):
+        index = _CAN_INDEX.get(can_id)
+        if index is None:
+            return None
+        if (index != 0 and index != self.next) or len(data) != CAN_MESSAGES[index][1]:
+            self.next = 0
+            return None
+        for offset, wire_offset, size in CAN_MESSAGES[index][2]:
+            self.wire[wire_offset:wire_offset + size] = data[offset:offset + size]
+        self.next = index + 1
+        if self.next < len(CAN_MESSAGES):
+            return None
+        self.next = 0
+        return unpack(self.wire)
+'''
+
+_PY_CODEC = '''
+def pack(frame):
+    return _pack(*frame)
+
+
+def pack_into(buffer, offset, frame):
+    FRAME_STRUCT.pack_into(buffer, offset, *frame)
+
+
+def unpack(buffer, offset=0):
+    return _make(_unpack_from(buffer, offset))
+
+
+def iter_unpack(buffer):
+    """CanFrames from a buffer of back-to-back payloads"""
+    return map(_make, FRAME_STRUCT.iter_unpack(buffer))
+
+'''
+
+_PY_BIT_CODEC = '''
+def _wire(frame):
+    """struct values of a frame, bit fields merged LSB first and cut to their width"""
+    return (
+{wire}    )
+
+
+def _values(v):
+{runs}    return (
+{values}    )
+
+
+def pack(frame):
+    return _pack(*_wire(frame))
+
+
+def pack_into(buffer, offset, frame):
+    FRAME_STRUCT.pack_into(buffer, offset, *_wire(frame))
+
+
+def unpack(buffer, offset=0):
+    return _make(_values(_unpack_from(buffer, offset)))
+
+
+def iter_unpack(buffer):
+    """CanFrames from a buffer of back-to-back payloads"""
+    return (_make(_values(v)) for v in FRAME_STRUCT.iter_unpack(buffer))
+
+'''
@@ -0,0 +1,178 @@
+"""Watches the target files of the web app projects and publishes struct changes.
+
+One background thread stats path_cs and path_cpp of every project that has
+a connected browser. After a change it waits until the files have been
+quiet for the debounce time (editors and the generator often write several
+times in a row), parses both structs with structparse and compares them
+with the last published state. Only real differences are pushed, as
+
+    {"variables": [...], "problems": [...],
+     "added": [names], "removed": [names], "changed": [names], "reordered": bool}
+
+to the queue of every subscriber; app.py streams them as Server-Sent Events.
+Reformatting a file or touching it without changing a field publishes nothing.
+"""
+
+import os
+import queue
+import threading
+import time
+
+import structparse
+
+DEFAULT_INTERVAL = 0.25
+DEFAULT_DEBOUNCE = 0.3
+QUEUE_SIZE = 16
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def diff_variables(old, new):
+    """Change event of two variable lists ({"cpp", "cs", "name"} dicts)"""
+    old_by_name = {v["name"]: v for v in old}
+    new_by_name = {v["name"]: v for v in new}
+    common_old = [v["name"] for v in old if v["name"] in new_by_name]
+    common_new = [v["name"] for v in new if v["name"] in old_by_name]
+    return {
+        "added": [n for n in new_by_name if n not in old_by_name],
+        "removed": [n for n in old_by_name if n not in new_by_name],
+        "changed": [n for n in common_new if old_by_name[n] != new_by_name[n]],
+        "reordered": common_old != common_new,
+    }
+
+
+class _Watch:
+    """Files and subscribers of one project"""
+
+    def __init__(self, key, path_cs, path_cpp):
+        self.key = key
+        self.paths = (path_cs, path_cpp)
+        self.subscribers = set()
+        self.seen = None        # stamps of the last poll
+        self.seen_at = 0.0      # when they last changed
+        self.published = None   # stamps the current state was parsed from
+        self.state = None       # {"variables", "problems"} last published
+
+    @classmethod
+    def loaded(cls, key, path_cs, path_cpp):
+        """Watch with the current state of the files; parses, so call without the lock"""
+        watch = cls(key, path_cs, path_cpp)
+        watch.seen = watch.published = (_stamp(path_cs), _stamp(path_cpp))
+        watch.state = watch.load()
+        return watch
+
+    def load(self):
+        final_vars, problems = structparse.load_variables(*self.paths)
+        return {"variables": [{"cpp": cpp, "cs": cs, "name": name} for cpp, cs, name in final_vars],
+                "problems": problems}
+
+
+class FileWatcher:
+    """Debounced change feed of the parsed target structs per project"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE):
+        self.interval = interval
+        self.debounce = debounce
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, key, path_cs, path_cpp):
+        """(queue, current state) for a new subscriber of project key"""
+        q = queue.Queue(QUEUE_SIZE)
+        paths = (path_cs, path_cpp)
+        fresh = None
+        while True:
+            with self._lock:
+                watch = self._watches.get(key)
+                if (watch is None or watch.paths != paths) and fresh is not None:
+                    watch = self._watches[key] = self._rebase(watch, fresh)
+                if watch is not None and watch.paths == paths:
+                    watch.subscribers.add(q)
+                    if self._thread is None:
+                        self._thread = threading.Thread(target=self._run, name="filewatch", daemon=True)
+                        self._thread.start()
+                    return q, watch.state
+            # Parse outside the lock, it would block the polls of all projects
+            fresh = _Watch.loaded(key, path_cs, path_cpp)
+
+    def unsubscribe(self, key, q):
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is not None:
+                watch.subscribers.discard(q)
+                if not watch.subscribers:
+                    del self._watches[key]
+
+    def set_paths(self, key, path_cs, path_cpp):
+        """Follow a config change; subscribers get the state of the new files at once"""
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None or watch.paths == (path_cs, path_cpp):
+                return
+        fresh = _Watch.loaded(key, path_cs, path_cpp)
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is not None and watch.paths != fresh.paths:
+                self._watches[key] = self._rebase(watch, fresh)
+
+    def _rebase(self, old, watch):
+        """Replace old by the loaded watch for other paths; keeps the subscribers and publishes the new files"""
+        if old is not None:
+            watch.subscribers = old.subscribers
+            self._publish(watch, old.state)
+        return watch
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                watches = list(self._watches.values())
+            for watch in watches:
+                try:
+                    self._poll(watch)
+                except Exception as e:
+                    # A broken file must not stop the feed of all projects
+                    print(f"filewatch: {watch.paths}: {e}")
+
+    def _poll(self, watch):
+        stamps = tuple(_stamp(p) for p in watch.paths)
+        now = time.monotonic()
+        if stamps != watch.seen:
+            watch.seen, watch.seen_at = stamps, now
+            return
+        if stamps == watch.published or now - watch.seen_at < self.debounce:
+            return
+        state = watch.load()
+        with self._lock:
+            if self._watches.get(watch.key) is not watch:
+                # Paths changed or last subscriber gone while parsing
+                return
+            previous = watch.state
+            watch.published, watch.state = stamps, state
+            self._publish(watch, previous)
+
+    @staticmethod
+    def _publish(watch, previous):
+        """Push the difference to previous; call with the lock held"""
+        if previous == watch.state:
+            return
+        event = dict(watch.state, **diff_variables(previous["variables"] if previous else [],
+                                                    watch.state["variables"]))
+        for q in watch.subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # A stalled browser skips intermediate states; every event carries the full list
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    # The subscriber drained the queue in the meantime
+                    pass
+                q.put_nowait(event)
@@ -1,4 +1,3 @@
-import re
 import os
 import json
 import tkinter as tk
@@ -6,6 +5,13 @@ from tkinter import messagebox
 from tkinter import ttk
 from tkinter import filedialog
 
+import canbus
+import codegen
+import layout
+import rewrite
+import statemachine
+import structparse
+
 # --- KONFIGURATIONSDATEI ---
 CONFIG_FILE = "generator_config.json"
 
@@ -14,22 +20,14 @@ DEFAULT_CONFIG = {
     "path_cs": r"C:/Users/benja/Documents/htlwy/2526/ccit/CANSender/CANSender/Program.cs",
     "path_cpp": r"C:/Users/benja/Documents/htlwy/2526/ccit/14_COBS_Receive/05_CAN_Signals/UserCode/UserMain.cpp",
     "com_port": "COM3",
-    "baud_rate": "1500000"
-}
-
-# Datatype mapping
-TYPE_MAPPING = {
-    "int8_t / sbyte": ("int8_t", "sbyte"),
-    "uint8_t / byte": ("uint8_t", "byte"),
-    "int16_t / short": ("int16_t", "short"),
-    "uint16_t / ushort": ("uint16_t", "ushort"),
-    "int32_t / int": ("int32_t", "int"),
-    "uint32_t / uint": ("uint32_t", "uint"),
-    "int64_t / long": ("int64_t", "long"),
-    "uint64_t / ulong": ("uint64_t", "ulong"),
-    "float": ("float", "float"),
-    "double": ("double", "double"),
-    "bool": ("bool", "bool"),
+    "baud_rate": "1500000",
+    "path_py": "can_frame.py",
+    "cs_serializer": codegen.DEFAULT_CS_SERIALIZER,
+    "frame_mode": codegen.DEFAULT_FRAME_MODE,
+    "keyframe_interval": codegen.DEFAULT_KEYFRAME_INTERVAL,
+    "can_mode": canbus.DEFAULT_CAN_MODE,
+    "can_base_id": canbus.DEFAULT_CAN_BASE_ID,
+    "sm_dispatch": statemachine.DEFAULT_SM_DISPATCH
 }
 
 class GeneratorUI:
@@ -49,8 +47,15 @@ class GeneratorUI:
         
         self.path_cs = self.config["path_cs"]
         self.path_cpp = self.config["path_cpp"]
+        self.path_py = self.config.get("path_py", DEFAULT_CONFIG["path_py"])
         self.com_port = self.config["com_port"]
         self.baud_rate = self.config["baud_rate"]
+        self.cs_serializer = self.config.get("cs_serializer", codegen.DEFAULT_CS_SERIALIZER)
+        self.frame_mode = self.config.get("frame_mode", codegen.DEFAULT_FRAME_MODE)
+        self.keyframe_interval = self.config.get("keyframe_interval", codegen.DEFAULT_KEYFRAME_INTERVAL)
+        self.can_mode = self.config.get("can_mode", canbus.DEFAULT_CAN_MODE)
+        self.can_base_id = self.config.get("can_base_id", canbus.DEFAULT_CAN_BASE_ID)
+        self.sm_dispatch = self.config.get("sm_dispatch", statemachine.DEFAULT_SM_DISPATCH)
 
         self.rows = []
         self.states = []
@@ -95,8 +100,15 @@ class GeneratorUI:
         config = {
             "path_cs": self.path_cs,
             "path_cpp": self.path_cpp,
+            "path_py": self.path_py,
             "com_port": self.com_port,
-            "baud_rate": self.baud_rate
+            "baud_rate": self.baud_rate,
+            "cs_serializer": self.cs_serializer,
+            "frame_mode": self.frame_mode,
+            "keyframe_interval": self.keyframe_interval,
+            "can_mode": self.can_mode,
+            "can_base_id": self.can_base_id,
+            "sm_dispatch": self.sm_dispatch
         }
         try:
             with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
@@ -143,6 +155,12 @@ class GeneratorUI:
         self.cpp_path_label.grid(row=3, column=0, columnspan=2, sticky="ew", pady=(0, 5))
         tk.Button(path_frame, text="Durchsuchen...", command=self.browse_cpp_file, width=15).grid(row=2, column=2, rowspan=2, padx=(5, 0), sticky="e")
 
+        # Python Path
+        tk.Label(path_frame, text="Python Modul:", font=("Arial", 9, "bold")).grid(row=4, column=0, sticky="w", pady=(5, 2))
+        self.py_path_label = tk.Label(path_frame, text=self.path_py, fg="blue", anchor="w", wraplength=400, justify="left", font=("Arial", 8))
+        self.py_path_label.grid(row=5, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+        tk.Button(path_frame, text="Durchsuchen...", command=self.browse_py_file, width=15).grid(row=4, column=2, rowspan=2, padx=(5, 0), sticky="e")
+
         # --- Settings Frame ---
         settings_frame = tk.LabelFrame(scrollframe, text="C# Projekteinstellungen", padx=10, pady=10)
         settings_frame.pack(fill="x", padx=5, pady=5)
@@ -162,6 +180,56 @@ class GeneratorUI:
         self.baud_rate_entry.grid(row=1, column=1, sticky="ew", padx=(0, 5))
         tk.Button(settings_frame, text="Speichern", command=self.save_baud_rate, width=12).grid(row=1, column=2, sticky="ew")
 
+        # Serializer
+        tk.Label(settings_frame, text="Serializer:", font=("Arial", 9, "bold")).grid(row=2, column=0, sticky="w", pady=(0, 5))
+        self.cs_serializer_combo = ttk.Combobox(settings_frame, width=18, state="readonly", values=list(codegen.CS_SERIALIZERS), font=("Arial", 9))
+        self.cs_serializer_combo.set(self.cs_serializer)
+        self.cs_serializer_combo.grid(row=2, column=1, sticky="ew", padx=(0, 5))
+        self.cs_serializer_combo.bind("<<ComboboxSelected>>", lambda e: self.save_cs_serializer())
+        tk.Label(settings_frame, text="list = List<byte> + BitConverter, span = Span<byte> ohne Allokation", font=("Arial", 8), fg="#555").grid(row=3, column=0, columnspan=3, sticky="w")
+
+        # Frame-Modus
+        tk.Label(settings_frame, text="Frame-Modus:", font=("Arial", 9, "bold")).grid(row=4, column=0, sticky="w", pady=(5, 5))
+        self.frame_mode_combo = ttk.Combobox(settings_frame, width=18, state="readonly", values=list(codegen.FRAME_MODES), font=("Arial", 9))
+        self.frame_mode_combo.set(self.frame_mode)
+        self.frame_mode_combo.grid(row=4, column=1, sticky="ew", padx=(0, 5))
+        self.frame_mode_combo.bind("<<ComboboxSelected>>", lambda e: self.save_frame_mode())
+
+        tk.Label(settings_frame, text="Keyframe alle:", font=("Arial", 9, "bold")).grid(row=5, column=0, sticky="w", pady=(0, 5))
+        self.keyframe_interval_entry = tk.Entry(settings_frame, width=20, font=("Arial", 9))
+        self.keyframe_interval_entry.insert(0, str(self.keyframe_interval))
+        self.keyframe_interval_entry.grid(row=5, column=1, sticky="ew", padx=(0, 5))
+        tk.Button(settings_frame, text="Speichern", command=self.save_frame_mode, width=12).grid(row=5, column=2, sticky="ew")
+        tk.Label(settings_frame, text="delta = nur geänderte Felder senden, alle N Frames ein ganzer Frame (Keyframe)", font=("Arial", 8), fg="#555").grid(row=6, column=0, columnspan=3, sticky="w")
+
+        # CAN-Segmentierung
+        tk.Label(settings_frame, text="CAN-Segmentierung:", font=("Arial", 9, "bold")).grid(row=7, column=0, sticky="w", pady=(5, 5))
+        self.can_mode_combo = ttk.Combobox(settings_frame, width=18, state="readonly", values=list(canbus.CAN_MODES), font=("Arial", 9))
+        self.can_mode_combo.set(self.can_mode)
+        self.can_mode_combo.grid(row=7, column=1, sticky="ew", padx=(0, 5))
+        self.can_mode_combo.bind("<<ComboboxSelected>>", lambda e: self.save_can_mode())
+
+        tk.Label(settings_frame, text="Erste CAN-ID:", font=("Arial", 9, "bold")).grid(row=8, column=0, sticky="w", pady=(0, 5))
+        self.can_base_id_entry = tk.Entry(settings_frame, width=20, font=("Arial", 9))
+        self.can_base_id_entry.insert(0, f"0x{canbus.parse_id(self.can_base_id):X}")
+        self.can_base_id_entry.grid(row=8, column=1, sticky="ew", padx=(0, 5))
+        tk.Button(settings_frame, text="Speichern", command=self.save_can_mode, width=12).grid(row=8, column=2, sticky="ew")
+        tk.Label(settings_frame, text="classic = 8 Byte, fd = 64 Byte pro Nachricht; der Frame wird auf möglichst wenige Nachrichten verteilt", font=("Arial", 8), fg="#555").grid(row=9, column=0, columnspan=3, sticky="w")
+
+        # --- Link Budget Frame ---
+        budget_frame = tk.LabelFrame(scrollframe, text="Link-Budget", padx=10, pady=10)
+        budget_frame.pack(fill="x", padx=5, pady=5)
+        budget_frame.grid_columnconfigure(1, weight=1)
+
+        tk.Label(budget_frame, text="Senderate (Frames/s):", font=("Arial", 9, "bold")).grid(row=0, column=0, sticky="w", pady=(0, 5))
+        self.send_rate_entry = tk.Entry(budget_frame, width=20, font=("Arial", 9))
+        self.send_rate_entry.insert(0, "1000")
+        self.send_rate_entry.grid(row=0, column=1, sticky="ew", padx=(0, 5))
+        tk.Button(budget_frame, text="Berechnen", command=self.update_frame_budget, width=12).grid(row=0, column=2, sticky="ew")
+
+        self.budget_label = tk.Label(budget_frame, text="", anchor="w", justify="left", font=("Courier", 8))
+        self.budget_label.grid(row=1, column=0, columnspan=3, sticky="ew")
+
     def setup_variables_tab(self):
         # Configure grid weights for responsive layout
         self.variables_tab.grid_rowconfigure(1, weight=1)  # Content area takes all available space
@@ -232,6 +300,17 @@ class GeneratorUI:
             self.save_config()
             self.setup_initial_data()
 
+    def browse_py_file(self):
+        file_path = filedialog.asksaveasfilename(
+            title="Python Modul auswählen",
+            defaultextension=".py",
+            filetypes=[("Python files", "*.py"), ("All files", "*.*")]
+        )
+        if file_path:
+            self.path_py = file_path
+            self.py_path_label.config(text=self.path_py)
+            self.save_config()
+
     def save_com_port(self):
         """COM-Port speichern und C# Code aktualisieren"""
         self.com_port = self.com_port_entry.get().strip()
@@ -259,20 +338,72 @@ class GeneratorUI:
         else:
             messagebox.showerror("Fehler", "Baudrate muss eine Zahl sein")
 
+    def save_cs_serializer(self):
+        """Serializer-Variante für SerializeFrame speichern"""
+        self.cs_serializer = self.cs_serializer_combo.get()
+        self.save_config()
+
+    def save_frame_mode(self):
+        """Frame-Modus (full/delta) und Keyframe-Intervall speichern"""
+        interval = self.keyframe_interval_entry.get().strip()
+        if not interval.isdigit() or int(interval) < 1:
+            messagebox.showerror("Fehler", "Keyframe-Intervall muss eine Zahl ab 1 sein")
+            return
+        self.frame_mode = self.frame_mode_combo.get()
+        self.keyframe_interval = int(interval)
+        self.save_config()
+
+    def save_can_mode(self):
+        """CAN-Segmentierung (off/classic/fd) und erste CAN-ID speichern"""
+        try:
+            base_id = canbus.parse_id(self.can_base_id_entry.get())
+        except ValueError:
+            messagebox.showerror("Fehler", "CAN-ID muss eine Zahl sein (z.B. 0x100)")
+            return
+        if not 0 <= base_id <= canbus.MAX_EXTENDED_ID:
+            messagebox.showerror("Fehler", "CAN-ID außerhalb des gültigen Bereichs")
+            return
+        self.can_mode = self.can_mode_combo.get()
+        self.can_base_id = base_id
+        self.save_config()
+
+    def save_sm_dispatch(self):
+        """Dispatch-Variante für compute() speichern"""
+        self.sm_dispatch = self.sm_dispatch_combo.get()
+        self.save_config()
+
+    def update_frame_budget(self):
+        """Berechnet Framegröße und maximale Framerate für Variablen und Baudrate"""
+        try:
+            frame_layout = layout.compute_layout(self.collect_final_vars(), delta=self.frame_mode == "delta")
+            rate = self.send_rate_entry.get().strip()
+            budget = layout.link_budget(frame_layout, self.baud_rate, float(rate) if rate else None)
+        except ValueError as e:
+            self.budget_label.config(text=str(e), fg="red")
+            return
+
+        text = (
+            f"Framegröße:        {budget['frame_size']} Bytes\n"
+            f"COBS-Overhead:     {budget['cobs_overhead']} Bytes (inkl. 0x00)\n"
+            f"UART-Framing:      {budget['uart_framing_bits']} Bits (8N1)\n"
+            f"Bits pro Frame:    {budget['bits_per_frame']} bei {budget['baud_rate']} Baud\n"
+            f"Max. Framerate:    {budget['max_frames_per_s']:.0f} Frames/s"
+        )
+        fg = "black"
+        if "send_rate" in budget:
+            text += f"\nAuslastung:        {budget['utilization'] * 100:.1f} % (Reserve {budget['headroom'] * 100:.1f} %)"
+            if budget["utilization"] > 1:
+                fg = "red"
+        self.budget_label.config(text=text, fg=fg)
+
     def update_cs_port_and_baud(self):
         """Aktualisiert COM-Port und Baudrate in der C# Datei"""
-        self.replace_in_file(
-            self.path_cs,
-            "// [PORTNAME_START]",
-            "// [PORTNAME_END]",
-            'private const string PortName = "' + self.com_port + '";'
-        )
-        self.replace_in_file(
-            self.path_cs,
-            "// [BAUDRATE_START]",
-            "// [BAUDRATE_END]",
-            'private const int BaudRate = ' + self.baud_rate + ';'
-        )
+        rewrite.rewrite_files({self.path_cs: [
+            rewrite.Region("// [PORTNAME_START]", "// [PORTNAME_END]",
+                           'private const string PortName = "' + self.com_port + '";'),
+            rewrite.Region("// [BAUDRATE_START]", "// [BAUDRATE_END]",
+                           'private const int BaudRate = ' + self.baud_rate + ';'),
+        ]})
 
     def setup_initial_data(self):
         # Clear existing rows
@@ -285,50 +416,13 @@ class GeneratorUI:
             self.add_row(cpp, cs, name)
 
     def read_variables_from_files(self):
-        try:
-            # Read C# file
-            cs_vars = {}
-            try:
-                with open(self.path_cs, 'r', encoding='utf-8-sig') as f:
-                    cs_content = f.read()
-                    start_idx = cs_content.find("// [GENERATED_STRUCT_START]")
-                    end_idx = cs_content.find("// [GENERATED_STRUCT_END]")
-                    if start_idx != -1 and end_idx != -1:
-                        struct_content = cs_content[start_idx:end_idx]
-                        # Extract: public TYPE NAME;
-                        for match in re.finditer(r'public\s+(\w+)\s+(\w+);', struct_content):
-                            cs_type, name = match.groups()
-                            cs_vars[name] = cs_type
-            except:
-                pass
-            
-            # Read C++ file
-            cpp_vars = {}
-            try:
-                with open(self.path_cpp, 'r', encoding='utf-8') as f:
-                    cpp_content = f.read()
-                    start_idx = cpp_content.find("// [GENERATED_STRUCT_START]")
-                    end_idx = cpp_content.find("// [GENERATED_STRUCT_END]")
-                    if start_idx != -1 and end_idx != -1:
-                        struct_content = cpp_content[start_idx:end_idx]
-                        # Extract: TYPE NAME;
-                        for match in re.finditer(r'(\w+[\s\*]*)\s+(\w+);', struct_content):
-                            cpp_type, name = match.groups()
-                            cpp_vars[name] = cpp_type.strip()
-            except:
-                pass
-            
-            # Combine both
-            result = []
-            seen_names = set()
-            for name in cpp_vars:
-                if name in cs_vars:
-                    result.append((cpp_vars[name], cs_vars[name], name))
-                    seen_names.add(name)
-            
-            return result if result else []
-        except:
-            return []
+        """Variablen aus den bestehenden Structs; Abweichungen werden gemeldet statt verworfen"""
+        final_vars, problems = structparse.load_variables(self.path_cs, self.path_cpp)
+        # Fehlende Dateien (z.B. noch nicht konfiguriert) sind kein Fehler
+        if problems and os.path.exists(self.path_cs) and os.path.exists(self.path_cpp):
+            shown = problems[:20] + ([f"... und {len(problems) - 20} weitere"] if len(problems) > 20 else [])
+            messagebox.showwarning("Struct-Analyse", "Beim Einlesen der bestehenden Structs:\n\n" + "\n".join(shown))
+        return final_vars
 
     def add_row(self, cpp="", cs="", name=""):
         row_num = len(self.rows)
@@ -348,7 +442,7 @@ class GeneratorUI:
 
         # Type combo (fixed width)
         type_combo = ttk.Combobox(row_frame, width=12, state="readonly", font=("Arial", 9))
-        type_combo['values'] = list(TYPE_MAPPING.keys())
+        type_combo['values'] = list(codegen.TYPE_MAPPING.keys())
         type_combo.grid(row=0, column=2, padx=2, pady=1, sticky="ew")
 
         # C++ Type entry (fixed width)
@@ -373,8 +467,8 @@ class GeneratorUI:
         # Bind dropdown selection
         def on_type_select(event):
             selected = type_combo.get()
-            if selected in TYPE_MAPPING:
-                cpp_type, cs_type = TYPE_MAPPING[selected]
+            if selected in codegen.TYPE_MAPPING:
+                cpp_type, cs_type = codegen.TYPE_MAPPING[selected]
                 cpp_ent.delete(0, tk.END)
                 cpp_ent.insert(0, cpp_type)
                 cs_ent.delete(0, tk.END)
@@ -413,65 +507,47 @@ class GeneratorUI:
             self.rows[idx]["frame"].destroy()
             self.rows.pop(idx)
 
-    def replace_in_file(self, file_path, start_tag, end_tag, new_content):
-        if not os.path.exists(file_path):
-            raise Exception(f"Pfad existiert nicht: {file_path}")
+    def collect_final_vars(self):
+        return codegen.final_vars_from_rows(
+            (row["cpp"].get(), row["cs"].get(), row["name"].get()) for row in self.rows)
 
-        content = None
-        for enc in ['utf-8-sig', 'utf-8', 'latin-1']:
-            try:
-                with open(file_path, 'r', encoding=enc) as f:
-                    content = f.read()
-                    break
-            except Exception:
-                continue
-        
-        if content is None:
-            raise Exception(f"Lesezugriff verweigert: {file_path}")
+    def generate(self):
+        final_vars = self.collect_final_vars()
 
-        pattern = f"{re.escape(start_tag)}.*?{re.escape(end_tag)}"
-        
-        if start_tag not in content:
-            raise Exception(f"Tag fehlt in {file_path}: {start_tag}")
+        if not final_vars:
+            messagebox.showerror("Fehler", "Keine Variablen definiert!")
+            return
 
-        # Finde die Einrückung der Start-Tag Zeile
-        match = re.search(f"^([ \t]*){re.escape(start_tag)}", content, re.MULTILINE)
-        indent = match.group(1) if match else ""
-        
-        replacement = f"{start_tag}\n{indent}{new_content}\n{indent}{end_tag}"
-        new_text = re.sub(pattern, replacement, content, flags=re.DOTALL)
-        
-        write_enc = 'utf-8-sig' if file_path.endswith(".cs") else 'utf-8'
-        with open(file_path, 'w', encoding=write_enc) as f:
-            f.write(new_text)
+        try:
+            frame_layout = layout.compute_layout(final_vars, delta=self.frame_mode == "delta")
+            mapping = canbus.map_messages(frame_layout, self.can_mode, self.can_base_id) if self.can_mode != "off" else None
+        except ValueError as e:
+            messagebox.showerror("Fehler", str(e))
+            return
 
-    def generate(self):
-        final_vars = []
-        for row in self.rows:
-            cpp = row["cpp"].get().strip()
-            cs = row["cs"].get().strip()
-            name = row["name"].get().strip()
-            if cpp and cs and name:
-                final_vars.append((cpp, cs, name))
-
-        cs_struct = "public struct CanFrame {\n"
-        cs_serialize = "    private static byte[] SerializeFrame(CanFrame frame) {\n        List<byte> bytes = new List<byte>();\n"
-        for _, cs_type, name in final_vars:
-            cs_struct += f"    public {cs_type} {name};\n"
-            cs_serialize += f"        bytes.AddRange(BitConverter.GetBytes(frame.{name}));\n"
-        cs_struct += "}"
-        cs_serialize += "        return bytes.ToArray();\n    }"
-
-        cpp_struct = "struct __attribute__((packed)) CanFrame {\n"
-        for cpp_type, _, name in final_vars:
-            cpp_struct += f"    {cpp_type} {name};\n"
-        cpp_struct += "};"
+        # Frames, die nicht in rxBuffer/decodedBuffer passen oder Bitfelder ohne CanFrame_Unpack,
+        # verwirft die Firmware
+        problems = layout.check_receiver(frame_layout, layout.read_receiver_limits(self.path_cpp))
+        if problems and not messagebox.askyesno(
+            "Warnung",
+            "Die Firmware kann diesen Frame nicht empfangen:\n\n" + "\n".join(problems)
+            + "\n\nDie Firmware würde jeden Frame verwerfen. Trotzdem generieren?"
+        ):
+            return
 
         try:
-            self.replace_in_file(self.path_cs, "// [GENERATED_STRUCT_START]", "// [GENERATED_STRUCT_END]", cs_struct)
-            self.replace_in_file(self.path_cs, "// [GENERATED_SERIALIZE_START]", "// [GENERATED_SERIALIZE_END]", cs_serialize)
-            self.replace_in_file(self.path_cpp, "// [GENERATED_STRUCT_START]", "// [GENERATED_STRUCT_END]", cpp_struct)
-            messagebox.showinfo("Erfolg", "Code erfolgreich generiert!")
+            # Alle Bereiche einer Datei in einem Durchgang ersetzen; geschrieben wird erst,
+            # wenn alle Dateien fehlerfrei erzeugt wurden
+            code = codegen.generate_code(final_vars, self.cs_serializer, self.frame_mode, self.keyframe_interval,
+                                         self.can_mode, self.can_base_id)
+            written = codegen.write_code(code, self.path_cs, self.path_cpp, self.path_py)
+
+            report = "\n".join(
+                f"{os.path.basename(path)}: {'geschrieben' if changed else 'unverändert'}"
+                for path, changed in written.items()
+            )
+            summary = frame_layout.summary() + (f"\n{mapping.summary()}" if mapping else "")
+            messagebox.showinfo("Erfolg", f"Code erfolgreich generiert!\n\n{report}\n\n{summary}")
         except Exception as e:
             messagebox.showerror("Fehler", str(e))
 
@@ -506,6 +582,13 @@ class GeneratorUI:
         self.events_text.pack(fill="both", expand=True)
         self.events_text.bind("<KeyRelease>", lambda e: self.update_transition_combos())
 
+        # if/else-Kette oder switch (S) / switch (E)
+        tk.Label(config_frame, text="Dispatch:", font=("Arial", 9, "bold")).grid(row=2, column=0, sticky="w", pady=(5, 0))
+        self.sm_dispatch_combo = ttk.Combobox(config_frame, width=10, state="readonly", values=list(statemachine.SM_DISPATCHES), font=("Arial", 9))
+        self.sm_dispatch_combo.set(self.sm_dispatch)
+        self.sm_dispatch_combo.grid(row=2, column=1, sticky="w", pady=(5, 0))
+        self.sm_dispatch_combo.bind("<<ComboboxSelected>>", lambda e: self.save_sm_dispatch())
+
         config_frame.grid_rowconfigure(1, weight=0)
 
         # --- MIDDLE: Builder + Transitions List ---
@@ -596,7 +679,8 @@ class GeneratorUI:
 
         tk.Button(btn_frame, text="Load Ex", command=self.load_example_sm, font=('Arial', 8), width=7).grid(row=0, column=0, padx=2, pady=5)
         tk.Button(btn_frame, text="Copy", command=self.copy_code_to_clipboard, font=('Arial', 8), width=6).grid(row=0, column=1, padx=2, pady=5, sticky="w")
-        tk.Button(btn_frame, text="CODE GENERIEREN", command=self.generate_statemachine, bg="green", fg="white", font=('Arial', 10, 'bold')).grid(row=0, column=2, padx=10, pady=5, sticky="ew")
+        tk.Button(btn_frame, text="Prüfen", command=self.analyze_statemachine, font=('Arial', 8), width=7).grid(row=0, column=2, padx=2, pady=5)
+        tk.Button(btn_frame, text="CODE GENERIEREN", command=self.generate_statemachine, bg="green", fg="white", font=('Arial', 10, 'bold')).grid(row=0, column=3, padx=10, pady=5, sticky="ew")
 
         self.sm_transitions = []
 
@@ -643,109 +727,47 @@ class GeneratorUI:
         states = [s.strip() for s in states_raw.split('\n') if s.strip()]
         events = [e.strip() for e in events_raw.split('\n') if e.strip()]
 
+        # Übergänge mit unbekannten States/Events ergeben nicht kompilierbaren Code
+        unknown = statemachine.unknown_names(states, events, self.sm_transitions)
+        if unknown:
+            messagebox.showerror("Fehler", "Unbekannte States/Events:\n" + "\n".join(unknown))
+            return
+
         # Generiere C++ Code
-        cpp_code = self._generate_cpp_statemachine(classname, states, events, self.sm_transitions)
+        try:
+            cpp_code = self._generate_cpp_statemachine(classname, states, events, self.sm_transitions)
+        except ValueError as e:
+            messagebox.showerror("Fehler", str(e))
+            return
         
         self.code_output.delete(1.0, tk.END)
         self.code_output.insert(1.0, cpp_code)
 
-    def _generate_cpp_statemachine(self, classname, states, events, transitions):
-        """Generiert C++ Zustandsautomaten Code"""
-        states_enum = ", ".join(states)
-        events_enum = ", ".join(events)
-
-        code = f"""class {classname} {{
-\tpublic:
-\t\tenum class State {{ {states_enum} }} S;
-\t\tenum class Event {{ None, {events_enum} }} E;
-\t\t
-\t\tbool\t\tiniOK = false;
-\t\tuint64_t\tt_cyc = 0;
-\t\tfloat\t\tt = 0;
-
-\t\tbool\t\tclick_Edge = false;
-
-\t\tvoid compute(float T)
-\t\t{{
-\t\t\t
-\t\t\tif(!iniOK) t_cyc = 0;
-\t\t\telse if(E == Event::None) t_cyc++;
-\t\t\telse t_cyc = 0;
-\t\t\tt = (t_cyc + 0.5f) * T;
-\t\t\t
-"""
-        # Erstes Transition als Init
-        first_state = transitions[0][0] if transitions else states[0]
-        code += f"\t\tif     (!iniOK) {{ E = Event::Init; S = State::{first_state}; }}\n"
-        
-        # Weitere Übergänge
-        for trans in transitions:
-            # Handle new format (6 elements with output_action and wildcard marker)
-            if len(trans) == 6:
-                from_state, event, to_state, conditions, output_action, is_wildcard = trans
-            else:
-                # Old format compatibility
-                from_state, event, to_state, conditions = trans
-                output_action = ""
-                is_wildcard = False
-            
-            condition_str = ""
-            
-            if conditions:
-                cond_parts = []
-                for var, op, val in conditions:
-                    if var == "click_Edge":
-                        cond_parts.append("click_Edge")
-                    else:
-                        cond_parts.append(f"{var} {op} {val}")
-                condition_str = " && ".join(cond_parts)
-            
-            if condition_str:
-                code += f"\t\telse if(S==State::{from_state} && {condition_str}) {{ E = Event::{event}; S = State::{to_state}; }}\n"
-            else:
-                code += f"\t\telse if(S==State::{from_state}) {{ E = Event::{event}; S = State::{to_state}; }}\n"
-        
-        code += """\t\telse{ E = Event::None; }
-\t\t\t
-\t\t\t//Outputs
-"""
-        
-        # Generate outputs for each event
-        output_actions = {}
-        for trans in transitions:
-            if len(trans) == 6:
-                from_state, event, to_state, conditions, output_action, is_wildcard = trans
-            else:
-                from_state, event, to_state, conditions = trans
-                output_action = ""
-            
-            if output_action:
-                output_actions[event] = output_action
-        
-        # Generate if-else chain for outputs
-        if output_actions:
-            first_output = True
-            for event in events:
-                if event != "Init" and event in output_actions:  # Skip Init event
-                    action = output_actions[event]
-                    if first_output:
-                        code += f"\t\tif\t\t\t(E==Event::{event:<20}\t) {action}\n"
-                        first_output = False
-                    else:
-                        code += f"\t\telse if\t(E==Event::{event:<20}\t) {action}\n"
-            
-            if not first_output:  # Only add else if we added at least one output
-                code += "\t\telse;\n"
+    def analyze_statemachine(self):
+        """Sucht unerreichbare States, Sackgassen, verdeckte Übergänge und nie ausgelöste Events"""
+        states = [s.strip() for s in self.states_text.get(1.0, tk.END).split('\n') if s.strip()]
+        events = [e.strip() for e in self.events_text.get(1.0, tk.END).split('\n') if e.strip()]
+        if not states or not self.sm_transitions:
+            messagebox.showerror("Fehler", "States und Übergänge sind erforderlich!")
+            return
+
+        analysis = statemachine.analyze(states, events, self.sm_transitions)
+
+        # Betroffene Übergänge in der Liste markieren
+        self.refresh_transitions_listbox()
+        for item in analysis["unknown"]:
+            self.transitions_listbox.itemconfig(item["index"], fg="red")
+        for item in analysis["shadowed"]:
+            self.transitions_listbox.itemconfig(item["index"], fg="gray")
+
+        if analysis["messages"]:
+            messagebox.showwarning("Analyse", "\n".join(analysis["messages"]))
         else:
-            code += f"\t\tif\t\t\t(E==Event::Init) {{}}\n"
-            code += "\t\t// TODO: Weitere Event-Outputs implementieren\n"
-        
-        code += """\t\t
-\t\tiniOK = true;
-\t\t}
-};"""
+            messagebox.showinfo("Analyse", "Keine Probleme gefunden.")
 
-        return code
+    def _generate_cpp_statemachine(self, classname, states, events, transitions):
+        """Generiert C++ Zustandsautomaten Code"""
+        return statemachine.generate_cpp_statemachine(classname, states, events, transitions, self.sm_dispatch)
 
     def update_transition_combos(self):
         """Aktualisiert die Dropdowns mit aktuellen States und Events"""
@@ -0,0 +1,271 @@
+"""Packed CanFrame layout: field offsets, sizes and worst-case COBS size.
+
+The C++ struct is __attribute__((packed)) and the C# serializers write the
+fields back to back, so a field's offset is the sum of the sizes before it.
+
+A type with a bit width ("bool:1", "uint8_t:4") makes a bit field.
+Consecutive bit fields share one run of bytes, packed LSB first (the
+first field in the lowest bits of the first byte); a run holds at most 64
+bits and is padded to whole bytes before the next byte-aligned field.
+
+In delta mode (see codegen) a payload is one header byte plus either the
+whole frame (keyframe) or a presence mask and the changed items, never
+more than the keyframe; buffers and budgets use that worst case.
+"""
+
+import re
+from collections import namedtuple
+
+import cobs
+
+CPP_TYPE_SIZES = {
+    "int8_t": 1, "uint8_t": 1, "char": 1, "signed char": 1, "unsigned char": 1,
+    "int16_t": 2, "uint16_t": 2, "short": 2, "unsigned short": 2,
+    "int32_t": 4, "uint32_t": 4, "int": 4, "unsigned int": 4,
+    "int64_t": 8, "uint64_t": 8, "long long": 8, "unsigned long long": 8,
+    "float": 4, "double": 8, "bool": 1,
+}
+
+CS_TYPE_SIZES = {
+    "sbyte": 1, "byte": 1, "bool": 1,
+    "short": 2, "ushort": 2,
+    "int": 4, "uint": 4,
+    "long": 8, "ulong": 8,
+    "float": 4, "double": 8,
+}
+
+# struct format character and NumPy dtype of every C++ type (char is unsigned on ARM)
+PY_FORMATS = {
+    "int8_t": ("b", "i1"), "signed char": ("b", "i1"),
+    "uint8_t": ("B", "u1"), "char": ("B", "u1"), "unsigned char": ("B", "u1"),
+    "int16_t": ("h", "<i2"), "short": ("h", "<i2"),
+    "uint16_t": ("H", "<u2"), "unsigned short": ("H", "<u2"),
+    "int32_t": ("i", "<i4"), "int": ("i", "<i4"),
+    "uint32_t": ("I", "<u4"), "unsigned int": ("I", "<u4"),
+    "int64_t": ("q", "<i8"), "long long": ("q", "<i8"),
+    "uint64_t": ("Q", "<u8"), "unsigned long long": ("Q", "<u8"),
+    "float": ("f", "<f4"), "double": ("d", "<f8"), "bool": ("?", "?"),
+}
+
+# Receive buffers in UserMain.cpp when they cannot be read from the file
+DEFAULT_RX_BUFFER_SIZE = 64
+
+# Bit fields: offset is the byte of the first bit, bit the position in that
+# byte, size the bytes the field touches; byte-aligned fields have bits None
+Field = namedtuple("Field", "name cpp_type cs_type offset size bit bits", defaults=(0, None))
+# Consecutive bit fields; a field's shift in the run is (offset - run.offset) * 8 + bit
+BitRun = namedtuple("BitRun", "offset size fields")
+
+MAX_RUN_BITS = 64
+_BIT_WIDTH = re.compile(r"^(.*?)\s*:\s*(\d+)$")
+
+
+class LayoutError(ValueError):
+    pass
+
+
+class FrameLayout:
+    def __init__(self, items, delta=False):
+        # Field or BitRun in wire order; in delta mode every item is one bit of the presence mask
+        self.items = items
+        self.delta = delta
+        self.fields = [f for item in items for f in (item.fields if isinstance(item, BitRun) else (item,))]
+        self.size = sum(item.size for item in items)
+
+    @property
+    def payload_size(self):
+        """Largest payload on the wire: the frame, plus the header byte in delta mode"""
+        return self.size + 1 if self.delta else self.size
+
+    @property
+    def mask_size(self):
+        """Bytes of the delta presence mask, one bit per item"""
+        return (len(self.items) + 7) // 8
+
+    @property
+    def has_bits(self):
+        return any(isinstance(item, BitRun) for item in self.items)
+
+    @property
+    def encoded_size(self):
+        """Worst-case COBS size without delimiter (what rxBuffer has to hold)"""
+        return cobs.max_encoded_size(self.payload_size)
+
+    @property
+    def wire_size(self):
+        """Worst-case bytes on the serial line per frame, delimiter included"""
+        return self.encoded_size + 1
+
+    @property
+    def struct_format(self):
+        """Little-endian struct format of the packed frame, e.g. '<i?'"""
+        return "<" + "".join(f"{item.size}s" if isinstance(item, BitRun) else PY_FORMATS[item.cpp_type][0]
+                             for item in self.items)
+
+    @property
+    def numpy_descr(self):
+        """Bit runs are raw byte columns named _bits<offset>"""
+        return [(f"_bits{item.offset}", "u1", (item.size,)) if isinstance(item, BitRun)
+                else (item.name, PY_FORMATS[item.cpp_type][1]) for item in self.items]
+
+    def summary(self):
+        if self.delta:
+            return (f"CanFrame: {self.size} bytes, delta mode: keyframe {self.payload_size} bytes, "
+                    f"COBS max. {self.wire_size} bytes on the wire")
+        return f"CanFrame: {self.size} bytes, COBS max. {self.wire_size} bytes on the wire"
+
+    def to_dict(self):
+        return {
+            "fields": [f._asdict() for f in self.fields],
+            "size": self.size,
+            "delta": self.delta,
+            "payload_size": self.payload_size,
+            "encoded_size": self.encoded_size,
+            "wire_size": self.wire_size,
+        }
+
+
+def split_bits(type_name):
+    """(type, bit width or None) of e.g. "uint8_t:4" """
+    if ":" not in type_name:
+        return type_name, None
+    match = _BIT_WIDTH.match(type_name.strip())
+    if match:
+        return match.group(1), int(match.group(2))
+    return type_name, None
+
+
+def compute_layout(final_vars, delta=False):
+    """Layout for the (cpp_type, cs_type, name) tuples of the variable list"""
+    items = []
+    run = None      # open BitRun: [offset, bits used, fields]
+    offset = 0
+
+    def close_run():
+        nonlocal run, offset
+        if run:
+            size = (run[1] + 7) // 8
+            items.append(BitRun(run[0], size, run[2]))
+            offset += size
+            run = None
+
+    for cpp_type, cs_type, name in final_vars:
+        cpp_type, cpp_bits = split_bits(cpp_type)
+        cs_type, cs_bits = split_bits(cs_type)
+        cpp_type = " ".join(cpp_type.split())
+        cs_type = cs_type.strip()
+        cpp_size = CPP_TYPE_SIZES.get(cpp_type)
+        cs_size = CS_TYPE_SIZES.get(cs_type)
+        if cpp_size is None:
+            raise LayoutError(f"Unknown C++ type '{cpp_type}' for field {name}")
+        if cs_size is None:
+            raise LayoutError(f"Unknown C# type '{cs_type}' for field {name}")
+        if cpp_size != cs_size:
+            raise LayoutError(f"Field {name}: C++ {cpp_type} has {cpp_size} bytes but C# {cs_type} has {cs_size}")
+        if cpp_bits is not None and cs_bits is not None and cpp_bits != cs_bits:
+            raise LayoutError(f"Field {name}: bit width {cpp_bits} in C++ but {cs_bits} in C#")
+        bits = cpp_bits if cpp_bits is not None else cs_bits
+
+        if bits is None:
+            close_run()
+            items.append(Field(name, cpp_type, cs_type, offset, cpp_size))
+            offset += cpp_size
+            continue
+        if cpp_type in ("float", "double"):
+            raise LayoutError(f"Field {name}: {cpp_type} cannot be a bit field")
+        if not 1 <= bits <= (1 if cpp_type == "bool" else cpp_size * 8):
+            raise LayoutError(f"Field {name}: bit width {bits} does not fit {cpp_type}")
+        if run and run[1] + bits > MAX_RUN_BITS:
+            close_run()
+        if run is None:
+            run = [offset, 0, []]
+        position = run[0] * 8 + run[1]
+        run[2].append(Field(name, cpp_type, cs_type, position // 8, (position % 8 + bits + 7) // 8,
+                            position % 8, bits))
+        run[1] += bits
+    close_run()
+    return FrameLayout(items, delta)
+
+
+def read_receiver_limits(cpp_path):
+    """Read rxBuffer / decodedBuffer sizes and the rxIndex type from UserMain.cpp.
+
+    Falls back to DEFAULT_RX_BUFFER_SIZE for anything that cannot be found.
+    """
+    source = ""
+    for enc in ['utf-8-sig', 'utf-8', 'latin-1']:
+        try:
+            with open(cpp_path, 'r', encoding=enc) as f:
+                source = f.read()
+                break
+        except Exception:
+            continue
+
+    def array_size(name):
+        match = re.search(rf"\b{name}\s*\[\s*(\d+)\s*\]", source)
+        return int(match.group(1)) if match else DEFAULT_RX_BUFFER_SIZE
+
+    limits = {"rx_buffer": array_size("rxBuffer"), "decoded_buffer": array_size("decodedBuffer")}
+    if source:
+        # A call of the generated helper outside the generated block
+        handwritten = re.sub(r"// \[GENERATED_STRUCT_START\].*?// \[GENERATED_STRUCT_END\]", "", source, flags=re.S)
+        limits["unpack_helper"] = re.search(r"\bCanFrame_Unpack\s*\(", handwritten) is not None
+        limits["delta_helper"] = re.search(r"\bCanFrame_ApplyDelta\s*\(", handwritten) is not None
+    match = re.search(r"\b(u?int(?:8|16|32)_t)\s+rxIndex\b", source)
+    if match:
+        bits = int(re.search(r"\d+", match.group(1)).group())
+        limits["rx_index_max"] = (1 << bits) - 1
+    return limits
+
+
+def check_receiver(layout, limits):
+    """Problems that make the firmware drop frames of this layout"""
+    problems = []
+    if layout.encoded_size > limits["rx_buffer"]:
+        problems.append(f"COBS-encoded frame ({layout.encoded_size} bytes) exceeds rxBuffer[{limits['rx_buffer']}]")
+    if layout.payload_size > limits["decoded_buffer"]:
+        what = "Delta keyframe" if layout.delta else "CanFrame"
+        problems.append(f"{what} ({layout.payload_size} bytes) exceeds decodedBuffer[{limits['decoded_buffer']}]")
+    if "rx_index_max" in limits and layout.encoded_size > limits["rx_index_max"]:
+        problems.append(f"COBS-encoded frame ({layout.encoded_size} bytes) exceeds the range of rxIndex (max. {limits['rx_index_max']})")
+    if layout.delta and not limits.get("delta_helper", True):
+        problems.append("delta mode needs CanFrame_ApplyDelta(&deltaState, decodedBuffer, len, &inputFrame) "
+                        "in the receiver instead of memcpy")
+    elif layout.has_bits and not limits.get("unpack_helper", True):
+        problems.append("bit fields need CanFrame_Unpack(decodedBuffer, &inputFrame) and len == CanFrameWireSize "
+                        "in the receiver instead of memcpy")
+    return problems
+
+
+def link_budget(layout, baud_rate, send_rate=None, bits_per_byte=10):
+    """Serial link budget of one frame layout.
+
+    bits_per_byte is the UART character length on the line: 10 for 8N1
+    (start + 8 data + stop), 11 for 8E1 or 8N2. Uses the worst-case COBS
+    size, which for frames below 254 bytes is also the exact size; in delta
+    mode that of a keyframe, deltas are shorter.
+    """
+    baud_rate = int(baud_rate)
+    bits_per_byte = int(bits_per_byte)
+    if baud_rate <= 0:
+        raise ValueError(f"Baud rate must be positive: {baud_rate}")
+    if bits_per_byte < 8:
+        raise ValueError(f"A UART character has at least 8 bits: {bits_per_byte}")
+    bits_per_frame = layout.wire_size * bits_per_byte
+    max_rate = baud_rate / bits_per_frame
+    budget = {
+        "frame_size": layout.payload_size,
+        "cobs_overhead": layout.wire_size - layout.payload_size,
+        "wire_size": layout.wire_size,
+        "uart_framing_bits": (bits_per_byte - 8) * layout.wire_size,
+        "bits_per_frame": bits_per_frame,
+        "baud_rate": baud_rate,
+        "max_frames_per_s": max_rate,
+        "payload_bytes_per_s": max_rate * layout.payload_size,
+    }
+    if send_rate:
+        send_rate = float(send_rate)
+        budget["send_rate"] = send_rate
+        budget["utilization"] = send_rate / max_rate
+        budget["headroom"] = 1.0 - budget["utilization"]
+    return budget
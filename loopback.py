@@ -0,0 +1,309 @@
+"""Pty loopback harness: end-to-end throughput and latency of the generated protocol.
+
+Opens a pseudo-terminal pair and runs both ends of the serial link on one
+machine, without a board or a COM port:
+
+    sender      generated pack() (or DeltaEncoder), COBS, streamer.stream_frames
+                writing to the pty like to a serial port
+    receiver    FirmwareReceiver, a Python stand-in for loop() in UserMain.cpp:
+                bytes into rxBuffer until 0x00 (overflow resets rxIndex),
+                COBS_Decode, then the length check / CanFrame_ApplyDelta
+
+Every layout runs for the same count or duration and reports sustained
+frames/s, byte overhead (COBS code bytes and delimiter, the delta header)
+and a histogram of the per-frame latency from the write call to the
+decoded frame:
+
+    python loopback.py                                  # all built-in layouts, max rate
+    python loopback.py --rate 2000 --duration 5         # paced, latency without queueing
+    python loopback.py -l small -l bits --count 200000
+    python loopback.py --module can_frame.py            # the project's generated module
+    python loopback.py --output loopback.json
+
+A pty has no baud rate, so frames/s is what the host sustains; the
+"at baud" column is the limit of the real link at baud_rate (8N1). Needs
+os.openpty (Linux, macOS).
+"""
+
+import argparse
+import bisect
+import json
+import os
+import select
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+import cobs
+import codegen
+import layout
+import streamer
+
+# name -> (final_vars, frame_mode)
+LAYOUTS = {
+    "small": ([("int32_t", "int", "TestInt")], "full"),
+    "medium": ([("float", "float", "speed"), ("float", "float", "angle"), ("int32_t", "int", "position"),
+                ("int16_t", "short", "current"), ("uint16_t", "ushort", "voltage"), ("uint8_t", "byte", "mode"),
+                ("bool", "bool", "enabled"), ("uint32_t", "uint", "counter"), ("double", "double", "timestamp")],
+               "full"),
+    "large": ([("double", "double", f"value{i}") for i in range(7)], "full"),
+    "bits": ([("bool:1", "bool", f"flag{i}") for i in range(12)]
+             + [("uint8_t:4", "byte", "mode"), ("int16_t:12", "short", "setpoint"), ("int32_t", "int", "position")],
+             "full"),
+    "delta": ([("float", "float", "speed"), ("float", "float", "angle"), ("int32_t", "int", "position"),
+               ("int16_t", "short", "current"), ("uint16_t", "ushort", "voltage"), ("uint8_t", "byte", "mode"),
+               ("bool", "bool", "enabled"), ("uint32_t", "uint", "counter"), ("double", "double", "timestamp")],
+              "delta"),
+}
+
+# Upper bounds of the latency histogram in microseconds; the last bucket is open
+HISTOGRAM_US = (50, 100, 200, 500, 1_000, 2_000, 5_000, 10_000, 50_000)
+
+_READ_SIZE = 1 << 16
+# Receiver gives up this long after the sender finished and nothing arrived
+_DRAIN_SECONDS = 0.5
+
+
+class FirmwareReceiver:
+    """Receive loop of UserMain.cpp: rxBuffer, COBS_Decode and the frame length check.
+
+    Like the firmware, a frame longer than rxBuffer does not stop the
+    loop: rxIndex restarts at 0 and the overflowing byte is lost, so
+    only the tail of the frame survives and normally fails the decode.
+    """
+
+    def __init__(self, payload_size, rx_buffer=layout.DEFAULT_RX_BUFFER_SIZE, delta_decoder=None):
+        self.payload_size = payload_size
+        self.rx_buffer = rx_buffer
+        self.delta_decoder = delta_decoder
+        self.rx = bytearray()
+        self.frames = 0
+        self.dropped = 0
+        self.overflows = 0
+
+    def feed(self, data):
+        """Payloads of the frames completed by data, in order"""
+        payloads = []
+        start = 0
+        while True:
+            end = data.find(0, start)
+            if end < 0:
+                self._store(data[start:])
+                return payloads
+            self._store(data[start:end])
+            start = end + 1
+            if not self.rx:
+                continue
+            payload = self._decode(bytes(self.rx))
+            self.rx.clear()
+            if payload is None:
+                self.dropped += 1
+            else:
+                self.frames += 1
+                payloads.append(payload)
+
+    def _store(self, chunk):
+        total = len(self.rx) + len(chunk)
+        if total <= self.rx_buffer:
+            self.rx += chunk
+            return
+        # Every rx_buffer + 1 bytes the index wraps and one byte is lost
+        self.overflows += total // (self.rx_buffer + 1)
+        keep = total % (self.rx_buffer + 1)
+        self.rx = (self.rx + chunk)[total - keep:]
+
+    def _decode(self, encoded):
+        try:
+            payload = cobs.decode(encoded)
+        except cobs.DecodeError:
+            return None
+        if self.delta_decoder is not None:
+            return payload if self.delta_decoder.decode(payload) is not None else None
+        return payload if len(payload) == self.payload_size else None
+
+
+def layout_module(name, workdir):
+    """Generated Python module of a built-in layout"""
+    final_vars, frame_mode = LAYOUTS[name]
+    frame_layout = layout.compute_layout(final_vars, delta=frame_mode == "delta")
+    path = os.path.join(workdir, f"can_frame_{name}.py")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(codegen.generate_python_module(frame_layout))
+    return streamer.load_frame_module(path)
+
+
+def run_loopback(frame_module, rate=0.0, count=None, duration=None, batch=1, distinct=256,
+                 rx_buffer=layout.DEFAULT_RX_BUFFER_SIZE, staggered=True):
+    """Send counter frames of frame_module through a pty pair; statistics dict"""
+    payloads = list(streamer.counter_payloads(frame_module, distinct, staggered))
+    encoded = [bytes(cobs.encode_frames([p])) for p in payloads]
+    delta = hasattr(frame_module, "DeltaDecoder")
+    receiver = FirmwareReceiver(frame_module.SIZE + 1 if delta else frame_module.SIZE, rx_buffer,
+                                frame_module.DeltaDecoder() if delta else None)
+
+    master, slave = os.openpty()
+    # The slave fd directly: its device name looks like a UART on macOS (/dev/ttysNNN)
+    tty.setraw(slave)
+    endpoint = os.fdopen(slave, 'wb', buffering=0)
+
+    # Index of the first frame of every write and when it was issued
+    write_index, write_time = [], []
+    sent = [0]
+
+    def write(data):
+        write_index.append(sent[0])
+        write_time.append(time.perf_counter())
+        sent[0] += data.count(0)
+        view = memoryview(data)
+        while view:
+            view = view[endpoint.write(view):]
+
+    latencies = []
+    matched = [0]
+    done = threading.Event()
+
+    def receive():
+        expected = 0   # send index of the next frame to match
+        idle_since = None
+        while True:
+            ready, _, _ = select.select([master], [], [], 0.05)
+            if not ready:
+                if done.is_set():
+                    if matched[0] >= sent[0]:
+                        return
+                    idle_since = idle_since or time.perf_counter()
+                    if time.perf_counter() - idle_since > _DRAIN_SECONDS:
+                        return
+                continue
+            idle_since = None
+            try:
+                data = os.read(master, _READ_SIZE)
+            except OSError:
+                return
+            now = time.perf_counter()
+            for payload in receiver.feed(data):
+                # Frames arrive in order; skip the ones the receiver dropped
+                for _ in range(len(payloads)):
+                    if payloads[expected % len(payloads)] == payload:
+                        break
+                    expected += 1
+                k = bisect.bisect_right(write_index, expected) - 1
+                latencies.append(now - write_time[k])
+                expected += 1
+                matched[0] += 1
+
+    thread = threading.Thread(target=receive, name="loopback-rx", daemon=True)
+    thread.start()
+    try:
+        stats = streamer.stream_frames(write, encoded, rate, count, duration, batch)
+    finally:
+        done.set()
+        thread.join()
+        endpoint.close()
+        os.close(master)
+
+    stats.update({
+        "payload_size": frame_module.SIZE,
+        "delta": delta,
+        "received": receiver.frames,
+        "dropped": receiver.dropped,
+        "lost": stats["frames"] - receiver.frames - receiver.dropped,
+        "overflows": receiver.overflows,
+        "wire_bytes_per_frame": stats["bytes"] / stats["frames"] if stats["frames"] else 0.0,
+        "latency_us": latency_stats(latencies),
+    })
+    stats["overhead"] = stats["wire_bytes_per_frame"] / frame_module.SIZE - 1
+    return stats
+
+
+def latency_stats(latencies):
+    """Percentiles and histogram (counts per HISTOGRAM_US bucket) in microseconds"""
+    if not latencies:
+        return {}
+    us = sorted(x * 1e6 for x in latencies)
+    histogram = [0] * (len(HISTOGRAM_US) + 1)
+    for x in us:
+        histogram[bisect.bisect_left(HISTOGRAM_US, x)] += 1
+    return {
+        "mean": sum(us) / len(us),
+        "p50": us[len(us) // 2],
+        "p99": us[min(len(us) - 1, int(len(us) * 0.99))],
+        "max": us[-1],
+        "histogram": histogram,
+    }
+
+
+def format_histogram(histogram, width=40):
+    lines = []
+    total = sum(histogram) or 1
+    labels = [f"< {_format_us(b)}" for b in HISTOGRAM_US] + [f">= {_format_us(HISTOGRAM_US[-1])}"]
+    for label, n in zip(labels, histogram):
+        bar = "#" * round(n / total * width)
+        lines.append(f"  {label:>9} {n:9d} {n / total * 100:5.1f} % {bar}")
+    return "\n".join(lines)
+
+
+def _format_us(us):
+    return f"{us / 1000:g} ms" if us >= 1000 else f"{us} us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput and latency of the generated protocol over a pty pair")
+    parser.add_argument("-l", "--layout", action="append", choices=sorted(LAYOUTS),
+                        help="built-in layout, repeatable (default: all)")
+    parser.add_argument("--module", help="generated frame module to test instead of the built-in layouts")
+    parser.add_argument("--config", default=streamer.CONFIG_FILE, help="generator config (baud_rate)")
+    parser.add_argument("--rate", type=float, default=0.0, help="frames per second, 0 = as fast as possible")
+    parser.add_argument("--count", type=int, help="frames per layout")
+    parser.add_argument("--duration", type=float, help="seconds per layout (default: 2)")
+    parser.add_argument("--batch", type=int, default=1, help="frames per write")
+    parser.add_argument("--pattern", choices=("staggered", "counter"), default="staggered",
+                        help="staggered: field j changes every 2**j frames; counter: every field every frame")
+    parser.add_argument("--rx-buffer", type=int, default=layout.DEFAULT_RX_BUFFER_SIZE,
+                        help="size of rxBuffer in the firmware stand-in")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "openpty"):
+        parser.error("needs a POSIX pseudo-terminal (os.openpty), e.g. Linux or macOS")
+    if args.count is None and args.duration is None:
+        args.duration = 2.0
+    try:
+        baud = int(streamer.load_config(args.config).get("baud_rate", 1500000))
+    except (OSError, ValueError):
+        baud = 1500000
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="canloop-") as workdir:
+        if args.module:
+            modules = [(os.path.basename(args.module), streamer.load_frame_module(args.module))]
+        else:
+            modules = [(name, layout_module(name, workdir)) for name in args.layout or LAYOUTS]
+        print(f"{'layout':<12} {'payload':>7} {'wire':>6} {'overhead':>8} {'frames/s':>10} {'at baud':>8} "
+              f"{'p50 us':>8} {'p99 us':>8} {'max us':>9} {'lost':>5}")
+        for name, module in modules:
+            stats = run_loopback(module, args.rate, args.count, args.duration, args.batch, rx_buffer=args.rx_buffer,
+                                 staggered=args.pattern == "staggered")
+            stats["frames_per_s_at_baud"] = baud / 10 / stats["wire_bytes_per_frame"]
+            results[name] = stats
+            lat = stats["latency_us"]
+            print(f"{name:<12} {stats['payload_size']:7d} {stats['wire_bytes_per_frame']:6.1f} "
+                  f"{stats['overhead'] * 100:7.1f}% {stats['received'] / stats['seconds']:10.0f} "
+                  f"{stats['frames_per_s_at_baud']:8.0f} {lat.get('p50', 0):8.1f} {lat.get('p99', 0):8.1f} "
+                  f"{lat.get('max', 0):9.1f} {stats['lost'] + stats['dropped']:5d}", flush=True)
+        for name, stats in results.items():
+            if stats["latency_us"]:
+                print(f"\nlatency {name} ({stats['received']} frames)")
+                print(format_histogram(stats["latency_us"]["histogram"]))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"baud_rate": baud, "rate": args.rate, "batch": args.batch, "pattern": args.pattern,
+                       "results": results}, f, indent=2)
+    return 1 if any(s["lost"] or s["dropped"] for s in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""Rewriting of the generated regions between // [..._START] and // [..._END].
+
+All regions of a target file are located in a single linear scan and
+substituted together, and the result is written once via a temporary file
+and an atomic rename. All targets of one generation are rendered before the
+first one is written, so a missing tag aborts without touching any file,
+and a crash can never leave a half-generated file. Files whose content does
+not change are not written at all.
+
+rewrite_files streams: the target is memory-mapped, the tags are found by a
+byte-level regex scan over the map, and the untouched text around the
+regions is copied to the temporary file in chunks. Peak memory is a few
+chunks plus the generated blocks, whatever the size of the file (large
+amalgamated sources). render_regions is the same substitution on a string.
+"""
+
+import codecs
+import mmap
+import os
+import re
+import tempfile
+from collections import namedtuple
+
+_BOM = b"\xef\xbb\xbf"
+
+# Copy and decode granularity of the streaming rewriter
+_CHUNK = 1 << 20
+
+
+class RewriteError(Exception):
+    pass
+
+
+class Region(namedtuple("Region", "start_tag end_tag content optional")):
+    """One generated block; optional regions may be missing from the file"""
+
+    def __new__(cls, start_tag, end_tag, content, optional=False):
+        return super().__new__(cls, start_tag, end_tag, content, optional)
+
+
+def render_regions(text, regions, file_path=""):
+    """Return text with every region replaced, scanning the text once.
+
+    Every occurrence of a start tag is replaced up to the next matching
+    end tag. The generated block is indented like the start tag's line and
+    uses the file's newline style.
+    """
+    by_start = {}
+    for region in regions:
+        by_start[region.start_tag] = region
+    tags = set(by_start) | {r.end_tag for r in by_start.values()}
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(tags, key=len, reverse=True)))
+    newline = "\r\n" if "\r\n" in text else "\n"
+
+    out = []
+    pos = 0
+    current = None
+    indent = ""
+    found = set()
+    for match in pattern.finditer(text):
+        tag = match.group()
+        if current is None:
+            if tag not in by_start:
+                continue
+            current = by_start[tag]
+            line_start = text.rfind("\n", 0, match.start()) + 1
+            prefix = text[line_start:match.start()]
+            indent = prefix if not prefix.strip(" \t") else ""
+            out.append(text[pos:match.end()])
+        elif tag == current.end_tag:
+            content = current.content.replace("\n", newline)
+            out.append(f"{newline}{indent}{content}{newline}{indent}{current.end_tag}")
+            pos = match.end()
+            found.add(current.start_tag)
+            current = None
+
+    if current is not None:
+        raise RewriteError(f"End tag missing in {file_path}: {current.end_tag}")
+    missing = [r.start_tag for r in by_start.values() if r.start_tag not in found and not r.optional]
+    if missing:
+        raise RewriteError(f"Tag not found in {file_path}: {', '.join(missing)}")
+
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def _stage(file_path, data):
+    """Temp file next to file_path holding data (bytes, or a function writing to a file object)"""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".gen-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if callable(data):
+                data(f)
+            else:
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(file_path):
+            try:
+                os.chmod(tmp_path, os.stat(file_path).st_mode & 0o7777)
+            except OSError:
+                pass
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return tmp_path
+
+
+def _commit(tmp_path, file_path):
+    try:
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+
+def _discard(tmp_path):
+    try:
+        os.unlink(tmp_path)
+    except OSError:
+        pass
+
+
+def atomic_write(file_path, data):
+    """Write bytes through a temp file in the same directory and rename it"""
+    _commit(_stage(file_path, data), file_path)
+
+
+class _MappedSource:
+    """Read-only view of a target file: an mmap, or bytes for empty files"""
+
+    def __init__(self, file_path):
+        if not os.path.exists(file_path):
+            raise RewriteError(f"Path does not exist: {file_path}")
+        try:
+            self._file = open(file_path, 'rb')
+        except OSError as e:
+            raise RewriteError(f"Cannot read file: {file_path} ({e})") from e
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        except (OSError, ValueError) as e:
+            self._file.close()
+            raise RewriteError(f"Cannot read file: {file_path} ({e})") from e
+        self.bom = self.data[:3] == _BOM
+        self.start = 3 if self.bom else 0
+        self.encoding = 'utf-8' if self._is_utf8() else 'latin-1'
+
+    def _is_utf8(self):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            for pos in range(self.start, len(self.data), _CHUNK):
+                decoder.decode(self.data[pos:pos + _CHUNK])
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+
+def _plan_file(source, regions, file_path):
+    """Output of one file as (block, start, end) parts in file order.
+
+    block None copies source[start:end], a bytes block replaces it. Same
+    substitution as render_regions, on the bytes of the file. Returns
+    (parts, out_encoding, out_bom).
+    """
+    data = source.data
+    by_start = {}
+    for region in regions:
+        by_start[region.start_tag.encode(source.encoding)] = region
+    tags = set(by_start) | {r.end_tag.encode(source.encoding) for r in by_start.values()}
+    pattern = re.compile(b"|".join(re.escape(t) for t in sorted(tags, key=len, reverse=True)))
+    newline = "\r\n" if data.find(b"\r\n", source.start) >= 0 else "\n"
+
+    parts = []
+    pos = source.start
+    current = None
+    current_end = None
+    indent = b""
+    found = set()
+    for match in pattern.finditer(data, source.start):
+        tag = match.group()
+        if current is None:
+            if tag not in by_start:
+                continue
+            current = by_start[tag]
+            current_end = current.end_tag.encode(source.encoding)
+            line_start = max(data.rfind(b"\n", 0, match.start()) + 1, source.start)
+            prefix = data[line_start:match.start()]
+            indent = prefix if not prefix.strip(b" \t") else b""
+            parts.append((None, pos, match.end()))
+            block_start = match.end()
+        elif tag == current_end:
+            text_indent = indent.decode(source.encoding)
+            content = current.content.replace("\n", newline)
+            parts.append((f"{newline}{text_indent}{content}{newline}{text_indent}{current.end_tag}", block_start, match.end()))
+            pos = match.end()
+            found.add(current.start_tag)
+            current = None
+
+    if current is not None:
+        raise RewriteError(f"End tag missing in {file_path}: {current.end_tag}")
+    missing = [r.start_tag for r in by_start.values() if r.start_tag not in found and not r.optional]
+    if missing:
+        raise RewriteError(f"Tag not found in {file_path}: {', '.join(missing)}")
+
+    parts.append((None, pos, len(data)))
+
+    # C# files are always written with BOM, like Visual Studio does
+    out_encoding, out_bom = source.encoding, source.bom
+    if file_path.endswith(".cs"):
+        out_encoding, out_bom = 'utf-8', True
+    try:
+        return _encode_blocks(parts, out_encoding), out_encoding, out_bom
+    except UnicodeEncodeError:
+        return _encode_blocks(parts, 'utf-8'), 'utf-8', out_bom
+
+
+def _encode_blocks(parts, encoding):
+    return [(block if block is None else block.encode(encoding), start, end) for block, start, end in parts]
+
+
+def _plan_changes(source, parts, out_encoding, out_bom):
+    """Whether the planned output differs from the file; only generated blocks are compared"""
+    if out_bom != source.bom:
+        return True
+    if any(block is not None and block != source.data[start:end] for block, start, end in parts):
+        return True
+    # Transcoding latin-1 -> utf-8 changes every non-ASCII byte of the copied text
+    return out_encoding != source.encoding and any(
+        not source.data[a:b].isascii()
+        for block, start, end in parts if block is None
+        for a, b in _chunks(start, end))
+
+
+def _chunks(start, end):
+    for pos in range(start, end, _CHUNK):
+        yield pos, min(pos + _CHUNK, end)
+
+
+def _stream_output(source, parts, out_encoding, out_bom):
+    """Function writing the planned output to a file object"""
+    transcode = out_encoding != source.encoding
+
+    def write(f):
+        if out_bom:
+            f.write(_BOM)
+        for block, start, end in parts:
+            if block is not None:
+                f.write(block)
+                continue
+            for a, b in _chunks(start, end):
+                chunk = source.data[a:b]
+                f.write(chunk.decode(source.encoding).encode(out_encoding) if transcode else chunk)
+    return write
+
+
+def rewrite_files(plan):
+    """Apply {file_path: [Region, ...]} and return {file_path: written}.
+
+    Nothing is written unless every file could be rendered.
+    """
+    sources = []
+    pending = []
+    try:
+        for file_path, regions in plan.items():
+            source = _MappedSource(file_path)
+            sources.append(source)
+            output = _plan_file(source, regions, file_path)
+            pending.append((file_path, source, output if _plan_changes(source, *output) else None))
+
+        written = {}
+        for file_path, source, output in pending:
+            if output is not None:
+                # The map is closed before the rename, Windows cannot replace a mapped file
+                temp = _stage(file_path, _stream_output(source, *output))
+                source.close()
+                _commit(temp, file_path)
+            written[file_path] = output is not None
+        return written
+    finally:
+        for source in sources:
+            source.close()
+
+
+def write_if_changed(file_path, text):
+    """Atomically write a fully generated UTF-8 file unless it is unchanged"""
+    data = text.encode('utf-8')
+    if os.path.exists(file_path):
+        with open(file_path, 'rb') as f:
+            if f.read() == data:
+                return False
+    atomic_write(file_path, data)
+    return True
@@ -0,0 +1,402 @@
+"""C++ state machine emitter, shared by generator.py and app.py.
+
+A transition is (from_state, event, to_state, conditions, output_action
+[, is_wildcard]); conditions are (var, op, val) tuples. Transitions are
+checked in list order and the first one that matches fires. A from_state
+of "(alle)" matches every state at its position in that order.
+
+Dispatch variants of compute():
+    if      one if / else if chain over all transitions (original emitter)
+    switch  switch (S) with only the transitions of each state per case,
+            and switch (E) for the outputs
+    table   const transition table in flash, a per-state index into it and
+            a small interpreter loop; code size does not grow with the
+            number of transitions
+"""
+
+WILDCARD = "(alle)"
+
+SM_DISPATCHES = ("if", "switch", "table")
+DEFAULT_SM_DISPATCH = "if"
+
+
+def normalize_transition(trans):
+    """(from_state, event, to_state, conditions, output_action) of any stored format"""
+    from_state, event, to_state, conditions = trans[:4]
+    output_action = trans[4] if len(trans) > 4 else ""
+    return from_state, event, to_state, [tuple(c) for c in conditions], output_action or ""
+
+
+def condition_expr(conditions):
+    parts = []
+    for var, op, val in conditions:
+        if var == "click_Edge":
+            parts.append("click_Edge")
+        else:
+            parts.append(f"{var} {op} {val}")
+    return " && ".join(parts)
+
+
+def output_actions(transitions):
+    """Output action per event; a later transition overrides an earlier one"""
+    actions = {}
+    for _, event, _, _, output_action in map(normalize_transition, transitions):
+        if output_action:
+            actions[event] = output_action
+    return actions
+
+
+def transitions_by_state(states, transitions):
+    """Transitions that can fire in each state, in priority order"""
+    by_state = {state: [] for state in states}
+    for trans in map(normalize_transition, transitions):
+        if trans[0] == WILDCARD:
+            for candidates in by_state.values():
+                candidates.append(trans)
+        elif trans[0] in by_state:
+            by_state[trans[0]].append(trans)
+    return by_state
+
+
+def initial_state(states, transitions):
+    """Source of the first transition, like the original emitter"""
+    for trans in transitions:
+        if trans[0] != WILDCARD:
+            return trans[0]
+    return states[0]
+
+
+def generate_cpp_statemachine(classname, states, events, transitions, dispatch=DEFAULT_SM_DISPATCH):
+    if dispatch not in SM_DISPATCHES:
+        raise ValueError(f"Unknown state machine dispatch: {dispatch}")
+
+    if dispatch == "table":
+        return _generate_table_statemachine(classname, states, events, transitions)
+
+    code = _class_header(classname, states, events)
+    code += f"\t\tif     (!iniOK) {{ E = Event::Init; S = State::{initial_state(states, transitions)}; }}\n"
+
+    if dispatch == "switch":
+        code += _switch_transitions(states, transitions)
+    else:
+        code += _chain_transitions(transitions)
+    code += "\t\t\t\n\t\t\t//Outputs\n"
+
+    actions = output_actions(transitions)
+    if dispatch == "switch":
+        code += _switch_outputs(events, actions)
+    else:
+        code += _chain_outputs(events, actions)
+
+    code += "\t\t\n\t\tiniOK = true;\n\t\t}\n};"
+    return code
+
+
+def _class_header(classname, states, events, enum_base=""):
+    states_enum = ", ".join(states)
+    events_enum = ", ".join(events)
+
+    return f"""class {classname} {{
+\tpublic:
+\t\tenum class State{enum_base} {{ {states_enum} }} S;
+\t\tenum class Event{enum_base} {{ None, {events_enum} }} E;
+\t\t
+\t\tbool\t\tiniOK = false;
+\t\tuint64_t\tt_cyc = 0;
+\t\tfloat\t\tt = 0;
+
+\t\tbool\t\tclick_Edge = false;
+
+\t\tvoid compute(float T)
+\t\t{{
+\t\t\t
+\t\t\tif(!iniOK) t_cyc = 0;
+\t\t\telse if(E == Event::None) t_cyc++;
+\t\t\telse t_cyc = 0;
+\t\t\tt = (t_cyc + 0.5f) * T;
+\t\t\t
+"""
+
+
+def _chain_transitions(transitions):
+    code = ""
+    for from_state, event, to_state, conditions, _ in map(normalize_transition, transitions):
+        checks = [] if from_state == WILDCARD else [f"S==State::{from_state}"]
+        if conditions:
+            checks.append(condition_expr(conditions))
+        code += f"\t\telse if({' && '.join(checks) or 'true'}) {{ E = Event::{event}; S = State::{to_state}; }}\n"
+    code += "\t\telse{ E = Event::None; }\n"
+    return code
+
+
+def _switch_transitions(states, transitions):
+    """switch (S): the case of a state tests only its own transitions.
+
+    Transitions behind an unconditional one can never fire in that state
+    and are left out of its case.
+    """
+    code = "\t\telse switch (S)\n\t\t{\n"
+    with_default = False
+    for state, candidates in transitions_by_state(states, transitions).items():
+        if not candidates:
+            with_default = True
+            continue
+        code += f"\t\t\tcase State::{state}:\n"
+        unconditional = False
+        for i, (_, event, to_state, conditions, _) in enumerate(candidates):
+            action = f"{{ E = Event::{event}; S = State::{to_state}; }}"
+            if not conditions:
+                code += f"\t\t\t\t{'else ' if i else ''}{action}\n"
+                unconditional = True
+                break
+            code += f"\t\t\t\t{'else if' if i else 'if     '}({condition_expr(conditions)}) {action}\n"
+        if not unconditional:
+            code += "\t\t\t\telse{ E = Event::None; }\n"
+        code += "\t\t\t\tbreak;\n"
+    if with_default:
+        code += "\t\t\tdefault: E = Event::None; break;\n"
+    code += "\t\t}\n"
+    return code
+
+
+def _chain_outputs(events, actions):
+    code = ""
+    first_output = True
+    for event in events:
+        if event != "Init" and event in actions:
+            if first_output:
+                code += f"\t\tif\t\t\t(E==Event::{event:<20}\t) {actions[event]}\n"
+                first_output = False
+            else:
+                code += f"\t\telse if\t(E==Event::{event:<20}\t) {actions[event]}\n"
+    if not first_output:
+        code += "\t\telse;\n"
+    else:
+        code += "\t\tif\t\t\t(E==Event::Init) {}\n"
+        code += "\t\t// TODO: Weitere Event-Outputs implementieren\n"
+    return code
+
+
+def _switch_outputs(events, actions):
+    cases = [event for event in events if event != "Init" and event in actions]
+    if not cases:
+        return _chain_outputs(events, actions)
+    code = "\t\tswitch (E)\n\t\t{\n"
+    for event in cases:
+        code += f"\t\t\tcase Event::{event + ':':<21}\t{{ {actions[event]} }} break;\n"
+    code += "\t\t\tdefault: break;\n\t\t}\n"
+    return code
+
+
+def _generate_table_statemachine(classname, states, events, transitions):
+    """compute() as an interpreter over const tables.
+
+    The transitions of each state are stored back to back in
+    transitions[], stateIndex[s] .. stateIndex[s + 1] is the slice of
+    state s. Wildcards are copied into every slice at their priority
+    position. Conditions and outputs are member function pointers, so
+    their code can use the members of the class like in the other
+    variants. Both tables are const with constant initializers and end up
+    in flash.
+    """
+    init_state = initial_state(states, transitions)
+    actions = output_actions(transitions)
+
+    conditions = {}
+    entries = []
+    index = [0]
+    for state, candidates in transitions_by_state(states, transitions).items():
+        for _, event, to_state, conds, _ in candidates:
+            condition = None
+            if conds:
+                condition = conditions.setdefault(condition_expr(conds), f"cond{len(conditions)}")
+            output = f"out_{event}" if event != "Init" and event in actions else None
+            entries.append((state, event, to_state, condition, output))
+            # Nothing behind an unconditional transition can fire in this state
+            if condition is None:
+                break
+        index.append(len(entries))
+    if not entries:
+        raise ValueError("No transition starts in one of the defined states")
+
+    enum_base = " : uint8_t" if max(len(states), len(events) + 1) <= 256 else " : uint16_t"
+    index_type = "uint8_t" if len(entries) <= 255 else "uint16_t"
+    ref = lambda name: f"&{classname}::{name}" if name else "nullptr"
+
+    code = _class_header(classname, states, events, enum_base)
+    code += f"\t\tvoid ({classname}::*output)() = nullptr;\n"
+    code += f"\t\tif     (!iniOK) {{ E = Event::Init; S = State::{init_state}; }}\n"
+    code += """\t\telse
+\t\t{
+\t\t\tconst Transition* tr = &transitions[stateIndex[static_cast<size_t>(S)]];
+\t\t\tconst Transition* const end = &transitions[stateIndex[static_cast<size_t>(S) + 1]];
+\t\t\tE = Event::None;
+\t\t\tfor (; tr != end; ++tr)
+\t\t\t{
+\t\t\t\tif (tr->condition == nullptr || (this->*tr->condition)()) { E = tr->event; S = tr->to; output = tr->output; break; }
+\t\t\t}
+\t\t}
+\t\t\t
+\t\t\t//Outputs
+\t\tif (output) (this->*output)();
+\t\t
+\t\tiniOK = true;
+\t\t}
+
+\tprivate:
+\t\tstruct Transition
+\t\t{
+\t\t\tState\tfrom;
+\t\t\tEvent\tevent;
+\t\t\tState\tto;
+"""
+    code += f"\t\t\tbool\t({classname}::*condition)() const;\n"
+    code += f"\t\t\tvoid\t({classname}::*output)();\n"
+    code += "\t\t};\n"
+    code += f"\t\tstatic const Transition\ttransitions[{len(entries)}];\n"
+    code += f"\t\tstatic const {index_type}\tstateIndex[{len(index)}];\n"
+    code += "\n\t\t// Conditions\n"
+    for expr, name in conditions.items():
+        code += f"\t\tbool {name}() const {{ return {expr}; }}\n"
+    code += "\n\t\t// Outputs\n"
+    for event in events:
+        if event != "Init" and event in actions:
+            code += f"\t\tvoid out_{event}() {{ {actions[event]} }}\n"
+    code += "};\n\n"
+
+    code += f"const {classname}::Transition {classname}::transitions[{len(entries)}] = {{\n"
+    for state, event, to_state, condition, output in entries:
+        code += f"\t{{ State::{state}, Event::{event}, State::{to_state}, {ref(condition)}, {ref(output)} }},\n"
+    code += "};\n"
+    code += f"const {index_type} {classname}::stateIndex[{len(index)}] = {{ {', '.join(map(str, index))} }};"
+    return code
+
+
+def describe_transition(index, trans):
+    from_state, event, to_state = trans[:3]
+    return f"#{index + 1} {from_state} → [{event}] → {to_state}"
+
+
+def unknown_names(states, events, transitions):
+    """"#i from → [event] → to: names" of every transition using undefined states or events"""
+    return [f"{describe_transition(u['index'], transitions[u['index']])}: {', '.join(u['names'])}"
+            for u in analyze(states, events, transitions)["unknown"]]
+
+
+def analyze(states, events, transitions):
+    """Static checks of a state machine, linear in the number of transitions.
+
+    Returns a dict of lists:
+        unknown      transitions that use undefined states or events
+        shadowed     transitions that can never fire because an earlier
+                     unconditional transition leaves the same state
+        unreachable  states never entered from the initial state
+        dead_ends    states without a transition to another state
+        never_fired  events no reachable, unshadowed transition sets
+        messages     all findings as text
+    """
+    transitions = [normalize_transition(t) for t in transitions]
+    state_set = set(states)
+    event_set = set(events)
+
+    unknown = []
+    shadowed = []
+    # First unconditional transition per state, in priority order
+    blocker = {}
+    # Latest of the blockers, once every state has one
+    last_blocker = None
+    wildcard_blocker = None
+    live = []
+    for i, (from_state, event, to_state, conditions, _) in enumerate(transitions):
+        names = [(from_state, state_set | {WILDCARD}), (to_state, state_set)]
+        missing = [name for name, known in names if name not in known]
+        if event not in event_set:
+            missing.append(event)
+        if missing:
+            unknown.append({"index": i, "names": missing})
+            continue
+
+        if from_state == WILDCARD:
+            by = wildcard_blocker
+            if by is None and len(blocker) == len(state_set):
+                # Every state already leaves unconditionally
+                by = last_blocker
+        else:
+            by = wildcard_blocker if from_state not in blocker else blocker[from_state]
+            if wildcard_blocker is not None and from_state in blocker:
+                by = min(by, wildcard_blocker)
+        if by is not None:
+            shadowed.append({"index": i, "by": by})
+            continue
+
+        live.append(i)
+        if not conditions:
+            if from_state == WILDCARD:
+                wildcard_blocker = i
+            elif from_state not in blocker:
+                blocker[from_state] = i
+                if len(blocker) == len(state_set):
+                    last_blocker = i
+
+    # Reachability over the transitions that can fire
+    edges = {state: [] for state in states}
+    wildcards = []
+    for i in live:
+        from_state = transitions[i][0]
+        (wildcards if from_state == WILDCARD else edges[from_state]).append(i)
+
+    start = initial_state(states, transitions) if states else None
+    reached = set()
+    fired = set()
+    if start in state_set:
+        # Wildcards fire from the initial state already
+        queue = [start]
+        reached.add(start)
+        for i in wildcards:
+            fired.add(transitions[i][1])
+            if transitions[i][2] not in reached:
+                reached.add(transitions[i][2])
+                queue.append(transitions[i][2])
+        while queue:
+            for i in edges[queue.pop()]:
+                fired.add(transitions[i][1])
+                target = transitions[i][2]
+                if target not in reached:
+                    reached.add(target)
+                    queue.append(target)
+
+    # A wildcard to X leaves every state except X
+    wildcard_targets = {transitions[i][2] for i in wildcards}
+    unreachable = [state for state in states if state not in reached]
+    # With two wildcard targets every state leaves through one of them
+    if len(wildcard_targets) >= 2:
+        dead_ends = []
+    else:
+        dead_ends = [
+            state for state in states
+            if wildcard_targets <= {state}
+            and not any(transitions[i][2] != state for i in edges[state])
+        ]
+    never_fired = [event for event in events if event != "Init" and event not in fired]
+
+    messages = []
+    for item in unknown:
+        messages.append(f"{describe_transition(item['index'], transitions[item['index']])}: unknown {', '.join(item['names'])}")
+    for item in shadowed:
+        messages.append(f"{describe_transition(item['index'], transitions[item['index']])} never fires, "
+                        f"#{item['by'] + 1} leaves the state unconditionally before it")
+    for state in unreachable:
+        messages.append(f"State {state} is unreachable")
+    for state in dead_ends:
+        messages.append(f"State {state} is a dead end (no transition to another state)")
+    for event in never_fired:
+        messages.append(f"Event {event} never fires")
+
+    return {
+        "unknown": unknown,
+        "shadowed": shadowed,
+        "unreachable": unreachable,
+        "dead_ends": dead_ends,
+        "never_fired": never_fired,
+        "messages": messages,
+    }
@@ -0,0 +1,253 @@
+"""Headless CanFrame streamer: sends COBS-encoded frames at a target rate.
+
+Uses com_port/baud_rate from generator_config.json and the frame layout of
+the generated Python module (path_py). The endpoint can be a serial port
+(COMx or /dev/tty*, needs pyserial), a pty, a regular file or "-" for
+stdout, so the sender can be benchmarked without hardware:
+
+    python streamer.py --rate 5000 --duration 10
+    python streamer.py --port /dev/pts/3 --rate 0 --count 100000
+    python streamer.py --port /dev/null --rate 0 --duration 5
+
+Frames are written in batches (write coalescing); pacing follows an
+absolute schedule with a short busy-wait before each deadline, and the
+send jitter is the delay of every write behind its scheduled time.
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import math
+import os
+import re
+import sys
+import time
+
+import cobs
+
+CONFIG_FILE = "generator_config.json"
+
+# Sleep until this close to a deadline, then busy-wait
+_SPIN_SECONDS = 0.0005
+
+
+def load_config(path=CONFIG_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_frame_module(path):
+    """Import the generated can_frame module from its file path"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Frame module not found: {path} (generate the code first)")
+    spec = importlib.util.spec_from_file_location("can_frame", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _field_value(cpp_type, bits, i):
+    if cpp_type == "bool":
+        return bool(i & 1)
+    if cpp_type in ("float", "double"):
+        return float(i)
+    if cpp_type.startswith("u") or cpp_type in ("char", "unsigned char"):
+        return i & ((1 << bits) - 1)
+    return (i & ((1 << bits) - 1)) - (1 << (bits - 1))
+
+
+def counter_payloads(frame_module, distinct=256, staggered=False):
+    """Payloads whose fields count up, cycling through `distinct` frames.
+
+    staggered: field j counts only every 2**j frames, so most fields stay
+    the same from one frame to the next, like slowly changing signals.
+
+    A delta mode module (DeltaEncoder) gets delta payloads. They depend on the
+    previous frame, so the cycle is stretched to a multiple of the 128
+    sequence numbers: repeating it then continues the sequence, and its first
+    payload is a keyframe.
+    """
+    encoder = frame_module.DeltaEncoder() if hasattr(frame_module, "DeltaEncoder") else None
+    count = -(-distinct // 128) * 128 if encoder else distinct
+    for i in range(count):
+        # LAYOUT rows are (name, cpp_type, cs_type, offset, size[, bit, bits]); bit fields count within their width
+        values = [_field_value(f[1], f[6] if len(f) > 6 and f[6] else f[4] * 8, i % distinct >> j if staggered else i % distinct)
+                  for j, f in enumerate(frame_module.LAYOUT)]
+        yield encoder.encode(values) if encoder else frame_module.pack(values)
+
+
+class _RawEndpoint:
+    """Unbuffered file/tty writer; ttys are switched to raw mode"""
+
+    def __init__(self, path):
+        flags = os.O_WRONLY | getattr(os, "O_NOCTTY", 0) | getattr(os, "O_BINARY", 0)
+        if not os.path.exists(path) or os.path.isfile(path):
+            flags |= os.O_CREAT | os.O_TRUNC
+        self.fd = os.open(path, flags, 0o644)
+        if os.isatty(self.fd):
+            import tty
+            tty.setraw(self.fd)
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            n = os.write(self.fd, view)
+            view = view[n:]
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _StdoutEndpoint:
+    def write(self, data):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    def close(self):
+        pass
+
+
+def _is_serial_port(port):
+    if re.match(r"^COM\d+$", port, re.IGNORECASE) or "://" in port:
+        return True
+    # Real UARTs need the baud rate set, pseudo-terminals do not
+    return port.startswith("/dev/tty") and os.path.exists(port)
+
+
+def open_endpoint(port, baud_rate):
+    """Serial port via pyserial, otherwise a raw file/pty or stdout"""
+    if port == "-":
+        return _StdoutEndpoint()
+    if not _is_serial_port(port):
+        return _RawEndpoint(port)
+    try:
+        import serial
+    except ImportError:
+        raise RuntimeError(f"pyserial is required to open {port} (pip install pyserial)") from None
+    return serial.Serial(port, int(baud_rate), write_timeout=5)
+
+
+def stream_frames(write, encoded_frames, rate=0.0, count=None, duration=None, batch=1):
+    """Write encoded frames (delimiter included) with pacing, return statistics.
+
+    rate is in frames/s, 0 means as fast as possible. Frames are cycled
+    until `count` frames were sent or `duration` seconds have passed;
+    without either, every frame in encoded_frames is sent once.
+    """
+    frames = list(encoded_frames)
+    if count is None and duration is None:
+        count = len(frames)
+    batch = max(1, int(batch))
+
+    # Pre-join the batches so the hot loop only does one write each
+    period = len(frames) * batch // math.gcd(len(frames), batch)
+    ring = list(itertools.islice(itertools.cycle(frames), period))
+    batches = [b"".join(ring[i:i + batch]) for i in range(0, period, batch)]
+
+    interval = batch / rate if rate else 0.0
+    jitter = []
+    sent_frames = sent_bytes = 0
+    perf_counter = time.perf_counter
+    sleep = time.sleep
+
+    start = perf_counter()
+    deadline = start
+    end_time = start + duration if duration is not None else None
+    index = 0
+    while True:
+        data = batches[index]
+        n = batch
+        if count is not None:
+            remaining = count - sent_frames
+            if remaining <= 0:
+                break
+            if remaining < batch:
+                data = b"".join(ring[index * batch:index * batch + remaining])
+                n = remaining
+        if interval:
+            now = perf_counter()
+            if deadline - now > _SPIN_SECONDS:
+                sleep(deadline - now - _SPIN_SECONDS)
+            while perf_counter() < deadline:
+                pass
+        now = perf_counter()
+        if end_time is not None and now >= end_time:
+            break
+        if interval:
+            jitter.append(now - deadline)
+            deadline += interval
+            # More than one batch behind: skip ahead instead of bursting to catch up
+            if now - deadline > interval:
+                deadline = now
+        write(data)
+        sent_frames += n
+        sent_bytes += len(data)
+        index = (index + 1) % len(batches)
+    elapsed = perf_counter() - start
+
+    stats = {
+        "frames": sent_frames,
+        "bytes": sent_bytes,
+        "seconds": elapsed,
+        "frames_per_s": sent_frames / elapsed if elapsed else 0.0,
+        "bytes_per_s": sent_bytes / elapsed if elapsed else 0.0,
+    }
+    if jitter:
+        jitter.sort()
+        stats["jitter_us"] = {
+            "mean": sum(jitter) / len(jitter) * 1e6,
+            "p50": jitter[len(jitter) // 2] * 1e6,
+            "p99": jitter[min(len(jitter) - 1, int(len(jitter) * 0.99))] * 1e6,
+            "max": jitter[-1] * 1e6,
+        }
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream COBS-encoded CanFrames at a target rate")
+    parser.add_argument("--config", default=CONFIG_FILE, help="generator config (com_port, baud_rate, path_py)")
+    parser.add_argument("--port", help="serial port, pty/tty device, file or - for stdout (default: com_port)")
+    parser.add_argument("--baud", type=int, help="baud rate (default: baud_rate)")
+    parser.add_argument("--module", help="generated frame module (default: path_py)")
+    parser.add_argument("--rate", type=float, default=0.0, help="frames per second, 0 = as fast as possible")
+    parser.add_argument("--count", type=int, help="number of frames to send")
+    parser.add_argument("--duration", type=float, help="seconds to stream")
+    parser.add_argument("--batch", type=int, default=0, help="frames per write (default: about 1 ms worth of frames)")
+    parser.add_argument("--distinct", type=int, default=256, help="number of distinct frames to cycle through")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config) if os.path.exists(args.config) else {}
+    port = args.port or config.get("com_port")
+    baud = args.baud or int(config.get("baud_rate", 1500000))
+    frame_module = load_frame_module(args.module or config.get("path_py", "can_frame.py"))
+    if not port:
+        parser.error("no port given and no com_port in the config")
+    if args.count is None and args.duration is None:
+        args.duration = 10.0
+
+    encoded = [bytes(cobs.encode_frames([p])) for p in counter_payloads(frame_module, args.distinct)]
+    batch = args.batch or (max(1, int(args.rate / 1000)) if args.rate else 64)
+
+    endpoint = open_endpoint(port, baud)
+    try:
+        stats = stream_frames(endpoint.write, encoded, args.rate, args.count, args.duration, batch)
+    finally:
+        endpoint.close()
+
+    line_bytes = baud / 10
+    out = sys.stderr if port == "-" else sys.stdout
+    wire = f"{sum(map(len, encoded)) / len(encoded):.1f} bytes on the wire (delta mode, mean)" \
+        if hasattr(frame_module, "DeltaEncoder") else f"{len(encoded[0])} bytes on the wire"
+    print(f"frame        {frame_module.SIZE} bytes payload, {wire}, batch {batch}", file=out)
+    print(f"sent         {stats['frames']} frames, {stats['bytes']} bytes in {stats['seconds']:.3f} s", file=out)
+    print(f"throughput   {stats['frames_per_s']:.0f} frames/s, {stats['bytes_per_s']:.0f} bytes/s "
+          f"({stats['bytes_per_s'] / line_bytes * 100:.1f} % of {baud} baud 8N1)", file=out)
+    if "jitter_us" in stats:
+        j = stats["jitter_us"]
+        print(f"jitter       mean {j['mean']:.1f} us, p50 {j['p50']:.1f} us, p99 {j['p99']:.1f} us, max {j['max']:.1f} us", file=out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""Parser for the CanFrame structs in the generated regions of the target files.
+
+Reads the [GENERATED_STRUCT] region of Program.cs and UserMain.cpp with a
+small C/C# tokenizer (comments, preprocessor lines, attributes such as
+__attribute__((packed)) or [MarshalAs(...)], access specifiers, constants
+and methods are skipped) and returns every data member with its
+qualifiers, array dimension and bit width. Parsed files are cached by
+real path, mtime and size, so an unchanged file is never read twice.
+
+load_variables pairs the two structs into the (cpp_type, cs_type, name)
+variable list and reports, instead of dropping silently, every field that
+exists on one side only, differs in type or order, or cannot be
+represented by the generator (arrays, pointers). C++ bit fields come back
+with their width ("uint8_t:4"), as the generator writes them.
+"""
+
+import mmap
+import os
+import re
+import threading
+from collections import namedtuple
+
+import layout
+
+START_TAG = "// [GENERATED_STRUCT_START]"
+END_TAG = "// [GENERATED_STRUCT_END]"
+
+# name, type (normalized), qualifiers, count (None, int or constant name,
+# "" for C# byte[]), bits (None or int), line in the file
+Member = namedtuple("Member", "name type qualifiers count bits line")
+ParsedStruct = namedtuple("ParsedStruct", "name members problems")
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<pp>\#[^\n]*)
+  | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<ident>[A-Za-z_]\w*(?:\s*(?:::|\.)\s*[A-Za-z_]\w*)*)
+  | (?P<number>\d[\w.]*)
+  | (?P<punct>.)
+""", re.S | re.X)
+
+_QUALIFIERS = {
+    "cpp": {"const", "volatile", "mutable", "static", "constexpr", "inline"},
+    "cs": {"public", "private", "internal", "protected", "readonly", "static", "const",
+           "volatile", "fixed", "unsafe", "new"},
+}
+# Qualifiers of members that are not part of the frame
+_CONSTANTS = {"cpp": {"static", "constexpr"}, "cs": {"static", "const"}}
+
+_CPP_ALIASES = {
+    "signed": "int", "unsigned": "unsigned int", "signed int": "int",
+    "short int": "short", "signed short": "short", "unsigned short int": "unsigned short",
+    "long long int": "long long", "signed long long": "long long",
+    "unsigned long long int": "unsigned long long",
+}
+
+# struct format character of every C# type, to compare with layout.PY_FORMATS
+_CS_FORMATS = {
+    "sbyte": "b", "byte": "B", "short": "h", "ushort": "H", "int": "i", "uint": "I",
+    "long": "q", "ulong": "Q", "float": "f", "double": "d", "bool": "?",
+}
+
+_CHUNK = 1 << 20
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def tokenize(text):
+    """(kind, value, line) of every token except whitespace and comments"""
+    tokens = []
+    line = 1
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        value = match.group()
+        if kind not in ("ws", "comment", "pp"):
+            tokens.append((kind, re.sub(r"\s+", "", value) if kind == "ident" else value, line))
+        line += value.count("\n")
+    return tokens
+
+
+_PAIRS = {"(": ")", "[": "]", "{": "}"}
+
+
+def _skip_group(tokens, i):
+    """Index after the bracket group opening at tokens[i]"""
+    stack = [_PAIRS[tokens[i][1]]]
+    i += 1
+    while i < len(tokens) and stack:
+        value = tokens[i][1]
+        if value in _PAIRS:
+            stack.append(_PAIRS[value])
+        elif value == stack[-1]:
+            stack.pop()
+        i += 1
+    return i
+
+
+def _skip_attributes(tokens, i, language):
+    """Skip __attribute__((...)), alignas(...), [[...]] and C# [Attribute(...)]"""
+    while i < len(tokens):
+        value = tokens[i][1]
+        if value in ("__attribute__", "alignas", "__declspec") and i + 1 < len(tokens) and tokens[i + 1][1] == "(":
+            i = _skip_group(tokens, i + 1)
+        elif value == "[" and (language == "cs" or (i + 1 < len(tokens) and tokens[i + 1][1] == "[")):
+            i = _skip_group(tokens, i)
+        else:
+            return i
+    return i
+
+
+def parse_struct(text, language):
+    """First struct/class of text; language is "cpp" or "cs" """
+    tokens = tokenize(text)
+    problems = []
+    i = 0
+    while i < len(tokens) and tokens[i][1] not in ("struct", "class"):
+        i += 1
+    if i == len(tokens):
+        return ParsedStruct(None, [], ["no struct found"])
+    i = _skip_attributes(tokens, i + 1, "cpp")
+    name = tokens[i][1] if i < len(tokens) and tokens[i][0] == "ident" else None
+    while i < len(tokens) and tokens[i][1] != "{":
+        i += 1
+    if i == len(tokens):
+        return ParsedStruct(name, [], [f"struct {name}: no body found"])
+    end = _skip_group(tokens, i) - 1
+    if tokens[end][1] != "}":
+        problems.append(f"struct {name}: closing brace missing")
+        end += 1
+
+    members = []
+    statement = []
+    i += 1
+    while i < end:
+        value = tokens[i][1]
+        if value in _PAIRS:
+            group_end = _skip_group(tokens, i)
+            group = tokens[i:group_end]
+            statement.extend(group)
+            i = group_end
+            values = [v for _, v, _ in statement]
+            if value != "{":
+                continue
+            if values[0] in ("struct", "class", "enum", "union"):
+                # Nested type; members declared with it are not supported
+                names = []
+                while i < end and tokens[i][1] != ";":
+                    if tokens[i][0] == "ident":
+                        names.append(tokens[i][1])
+                    i += 1
+                if names:
+                    problems.append(f"line {statement[0][2]}: member {', '.join(names)} of nested "
+                                    f"{values[0]} type not supported, skipped")
+                statement = []
+            elif "(" in values or any(v in ("get", "set") for _, v, _ in group):
+                # Method or C# property body, no ';' follows
+                statement = []
+            continue
+        if value == ";":
+            members.extend(_parse_member(statement, language, problems))
+            statement = []
+        elif value == ":" and language == "cpp" and [v for _, v, _ in statement] in (["public"], ["private"], ["protected"]):
+            statement = []
+        else:
+            statement.append(tokens[i])
+        i += 1
+    if statement:
+        problems.append(f"line {statement[0][2]}: declaration without ';'")
+    return ParsedStruct(name, members, problems)
+
+
+def _parse_member(statement, language, problems):
+    """Members declared by one statement (several for int a, b;)"""
+    statement = statement[_skip_attributes(statement, 0, language):]
+    if not statement:
+        return []
+    line = statement[0][2]
+    values = [value for _, value, _ in statement]
+    if "(" in values or values[0] in ("using", "typedef", "friend", "enum", "struct", "class", "union"):
+        # Methods, static_assert, nested types
+        return []
+
+    qualifiers = []
+    i = 0
+    while i < len(statement) and statement[i][1] in _QUALIFIERS[language]:
+        qualifiers.append(statement[i][1])
+        i += 1
+    if _CONSTANTS[language] & set(qualifiers):
+        # Not part of the frame, e.g. public const int Size = 4;
+        return []
+
+    # Type: everything up to the first declarator name
+    type_tokens = []
+    while i < len(statement):
+        kind, value, _ = statement[i]
+        if kind == "ident" and type_tokens and (i + 1 == len(statement) or statement[i + 1][1] in ("[", ":", "=", ",", "{")):
+            break
+        if value in ("const", "volatile"):
+            qualifiers.append(value)
+        else:
+            type_tokens.append(value)
+        i += 1
+    if not type_tokens or i == len(statement):
+        problems.append(f"line {line}: cannot parse '{' '.join(values)}'")
+        return []
+    cs_array = language == "cs" and type_tokens[-2:] == ["[", "]"]
+    if cs_array:
+        type_tokens = type_tokens[:-2]
+    type_name = _normalize_type(" ".join(t for t in type_tokens if t not in ("*", "&")), language)
+    if "*" in type_tokens or "&" in type_tokens:
+        type_name += "*"
+
+    members = []
+    while i < len(statement):
+        name = statement[i][1]
+        count = "" if cs_array else None
+        bits = None
+        i += 1
+        while i < len(statement) and statement[i][1] != ",":
+            value = statement[i][1]
+            if value == "[":
+                close = _skip_group(statement, i)
+                dim = "".join(v for _, v, _ in statement[i + 1:close - 1])
+                count = int(dim) if dim.isdigit() else dim
+                i = close
+            elif value == ":" and i + 1 < len(statement):
+                bits = int(statement[i + 1][1]) if statement[i + 1][1].isdigit() else statement[i + 1][1]
+                i += 2
+            elif value in _PAIRS:
+                # Brace or parenthesized initializer
+                i = _skip_group(statement, i)
+            else:
+                i += 1
+        members.append(Member(name, type_name, tuple(qualifiers), count, bits, line))
+        i += 1
+    return members
+
+
+def _normalize_type(type_name, language):
+    if language == "cpp":
+        type_name = re.sub(r"^std::", "", type_name)
+        return _CPP_ALIASES.get(type_name, type_name)
+    return {"System.Byte": "byte", "System.SByte": "sbyte", "System.Int16": "short", "System.UInt16": "ushort",
+            "System.Int32": "int", "System.UInt32": "uint", "System.Int64": "long", "System.UInt64": "ulong",
+            "System.Single": "float", "System.Double": "double", "System.Boolean": "bool"}.get(type_name, type_name)
+
+
+def _read_region(path):
+    """Text between the struct markers, None if the markers are missing"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = data.find(START_TAG.encode())
+            end = data.find(END_TAG.encode(), start + 1) if start >= 0 else -1
+            if start < 0 or end < 0:
+                return None
+            raw = data[start:end]
+            # Line numbers of the whole file, counted without copying it
+            line = sum(data[pos:min(pos + _CHUNK, start)].count(b"\n") for pos in range(0, start, _CHUNK))
+    try:
+        text = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        text = raw.decode('latin-1')
+    return "\n" * line + text
+
+
+def parse_file(path, language):
+    """ParsedStruct of the generated region of path, cached by (mtime, size)"""
+    key = os.path.normcase(os.path.realpath(path))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ParsedStruct(None, [], [f"{os.path.basename(path)}: file not found"])
+    stamp = (stat.st_mtime_ns, stat.st_size, language)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    try:
+        text = _read_region(path)
+    except OSError as e:
+        return ParsedStruct(None, [], [f"{os.path.basename(path)}: cannot read ({e})"])
+    if text is None:
+        result = ParsedStruct(None, [], [f"{os.path.basename(path)}: no {START_TAG} ... {END_TAG} region"])
+    else:
+        parsed = parse_struct(text, language)
+        result = parsed._replace(problems=[f"{os.path.basename(path)}: {p}" for p in parsed.problems])
+    with _cache_lock:
+        _cache[key] = (stamp, result)
+    return result
+
+
+def pair_members(cpp, cs):
+    """(final_vars, problems) of the C++ and C# ParsedStructs; C++ order wins"""
+    problems = list(cpp.problems) + list(cs.problems)
+    cs_by_name = {m.name: m for m in cs.members}
+    cpp_names = {m.name for m in cpp.members}
+    final_vars = []
+
+    for m in cpp.members:
+        other = cs_by_name.get(m.name)
+        if other is None:
+            problems.append(f"{m.name}: only in the C++ struct (line {m.line})")
+            continue
+        unsupported = _unsupported(m, "C++") or _unsupported(other, "C#")
+        if unsupported:
+            problems.append(f"{m.name}: {unsupported}, skipped")
+            continue
+        cpp_type = f"{m.type}:{m.bits}" if m.bits is not None else m.type
+        cpp_format = layout.PY_FORMATS.get(m.type, ("",))[0]
+        if m.type not in layout.CPP_TYPE_SIZES:
+            problems.append(f"{m.name}: unknown C++ type {m.type}")
+        elif other.type not in layout.CS_TYPE_SIZES:
+            problems.append(f"{m.name}: unknown C# type {other.type}")
+        elif cpp_format != _CS_FORMATS[other.type]:
+            problems.append(f"{m.name}: C++ {m.type} does not match C# {other.type}")
+        dropped = [f"C++ {q}" for q in m.qualifiers if q in ("const", "volatile", "mutable")]
+        dropped += [f"C# {q}" for q in other.qualifiers if q in ("readonly", "volatile", "fixed")]
+        if dropped:
+            problems.append(f"{m.name}: qualifier {', '.join(dropped)} is not generated")
+        final_vars.append((cpp_type, other.type, m.name))
+
+    for m in cs.members:
+        if m.name not in cpp_names:
+            problems.append(f"{m.name}: only in the C# struct (line {m.line})")
+
+    common_cpp = [m.name for m in cpp.members if m.name in cs_by_name]
+    common_cs = [m.name for m in cs.members if m.name in cpp_names]
+    if common_cpp != common_cs:
+        problems.append("field order differs between C++ and C#, the C++ order is used")
+    return final_vars, problems
+
+
+def _unsupported(member, side):
+    if member.type.endswith("*"):
+        return f"{side} pointer"
+    if member.count == "":
+        return f"C# array {member.type}[]"
+    if member.count is not None:
+        return f"{side} array [{member.count}]"
+    if member.bits is not None and (side == "C#" or not isinstance(member.bits, int)
+                                    or member.type in ("float", "double")):
+        return f"{side} bit field : {member.bits}"
+    return None
+
+
+def load_variables(path_cs, path_cpp):
+    """(final_vars, problems) from the generated structs of both target files"""
+    return pair_members(parse_file(path_cpp, "cpp"), parse_file(path_cs, "cs"))
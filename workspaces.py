@@ -0,0 +1,116 @@
+"""Per-project state of the web app and locks for the generated files.
+
+Every project ID gets its own Workspace (config, variables, state machine)
+guarded by its own lock, so concurrent requests of different projects
+never wait for each other. Target files are locked by their real path:
+two projects generating into the same Program.cs are serialized, different
+files are written in parallel.
+
+The "default" project uses generator_config.json like the desktop app;
+other projects keep their config in workspaces/<id>.json.
+"""
+
+import copy
+import json
+import os
+import re
+import threading
+from contextlib import ExitStack, contextmanager
+
+DEFAULT_PROJECT = "default"
+WORKSPACE_DIR = "workspaces"
+
+_PROJECT_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class Workspace:
+    def __init__(self, project_id, config_file, default_config):
+        self.project_id = project_id
+        self.config_file = config_file
+        self.lock = threading.RLock()
+        self.config = self._load_config(default_config)
+        self.variables = []
+        self.state_machine = {
+            "classname": "CanFrameSender",
+            "states": [],
+            "events": [],
+            "transitions": []
+        }
+
+    def _load_config(self, default_config):
+        config = copy.deepcopy(default_config)
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    config.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+        return config
+
+    def save_config(self):
+        """Write the config; call with the lock held"""
+        try:
+            directory = os.path.dirname(self.config_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                json.dump(self.config, f, indent=4)
+            return True, "Config saved"
+        except Exception as e:
+            return False, str(e)
+
+
+class WorkspaceStore:
+    def __init__(self, default_config, config_file, workspace_dir=WORKSPACE_DIR):
+        self.default_config = default_config
+        self.config_file = config_file
+        self.workspace_dir = workspace_dir
+        self._workspaces = {}
+        self._lock = threading.Lock()
+
+    def get(self, project_id=None):
+        """Workspace of a project, created on first use"""
+        project_id = project_id or DEFAULT_PROJECT
+        if not _PROJECT_ID.fullmatch(project_id):
+            raise ValueError(f"Invalid project ID: {project_id}")
+        with self._lock:
+            workspace = self._workspaces.get(project_id)
+            if workspace is None:
+                if project_id == DEFAULT_PROJECT:
+                    config_file = self.config_file
+                else:
+                    config_file = os.path.join(self.workspace_dir, f"{project_id}.json")
+                workspace = Workspace(project_id, config_file, self.default_config)
+                self._workspaces[project_id] = workspace
+            return workspace
+
+    def project_ids(self):
+        with self._lock:
+            loaded = set(self._workspaces)
+        if os.path.isdir(self.workspace_dir):
+            loaded.update(name[:-5] for name in os.listdir(self.workspace_dir)
+                          if name.endswith(".json") and _PROJECT_ID.fullmatch(name[:-5]))
+        return sorted(loaded | {DEFAULT_PROJECT})
+
+
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _path_lock(path):
+    key = os.path.normcase(os.path.realpath(path))
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = threading.Lock()
+        return key, lock
+
+
+@contextmanager
+def locked_paths(paths):
+    """Hold the locks of all target files; always taken in the same order"""
+    locks = dict(_path_lock(p) for p in paths if p)
+    with ExitStack() as stack:
+        for key in sorted(locks):
+            stack.enter_context(locks[key])
+        yield